@@ -24,6 +24,7 @@ import prunerr.downloadclient
 import prunerr.downloaditem
 import prunerr.operations
 import prunerr.servarr
+import prunerr.deleter
 from . import utils
 
 logger = logging.getLogger(__name__)
@@ -64,6 +65,14 @@ The path to the Prunerr configuration file. Example:
 https://gitlab.com/rpatterson/prunerr/-/blob/main/src/prunerr/home/.config/prunerr.yml\
 """,
 )
+parser.add_argument(
+    "--stats",
+    action="store_true",
+    help="""\
+Add the calls, retries, response sizes, and response times of each download client and
+Servarr API endpoint to the JSON output.\
+""",
+)
 # Define command-line subcommands:
 subparsers = parser.add_subparsers(
     dest="command",
@@ -72,6 +81,61 @@ subparsers = parser.add_subparsers(
 )
 
 
+def add_operations_profile(
+    runner: prunerr.runner.PrunerrRunner,
+    results: typing.Optional[dict],
+) -> typing.Optional[dict]:
+    """
+    Add the operations profile of each download client alongside the results.
+
+    :param runner: The runner whose download clients profiled their operations
+    :param results: The results of the sub-command
+    :return: The results with the operations profiles added if profiling operations
+    """
+    if not runner.profile_operations:
+        return results
+    results = dict(results or {})
+    results["profile-operations"] = {
+        download_client_url: download_client.operations_profile.as_json()
+        for download_client_url, download_client in runner.download_clients.items()
+        if download_client.operations_profile is not None
+    }
+    return results
+
+
+def add_profile_operations_argument(subparser: argparse.ArgumentParser) -> None:
+    """
+    Add the option to profile operations to the sub-command's parser.
+
+    :param subparser: The parser of the sub-command that evaluates operations
+    """
+    subparser.add_argument(
+        "--profile-operations",
+        action="store_true",
+        help="""\
+Record the calls, time, and cache hits of each operation type and explain which
+operation decided each download item's inclusion and order.  Output as JSON with the
+results.\
+""",
+    )
+
+
+def add_profile_argument(subparser: argparse.ArgumentParser) -> None:
+    """
+    Add the option to profile loops to the sub-command's parser.
+
+    :param subparser: The parser of the sub-command that runs the loops
+    """
+    subparser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="""\
+Profile each loop of the order of operations and write the statistics of loops slower
+than `daemon/profile/min-duration` to `*.pstats` files in this directory.\
+""",
+    )
+
+
 def verify(  # pylint: disable=missing-function-docstring,missing-return-doc
     runner,
     *args,
@@ -99,7 +163,10 @@ def move(  # pylint: disable=missing-function-docstring,missing-return-doc
     **kwargs,
 ) -> dict:
     runner.update()
-    return runner.move(*args, **kwargs)
+    move_results = runner.move(*args, **kwargs)
+    # Wait for all moving items to finish when doing a single `move` run.
+    runner.wait_moves()
+    return move_results
 
 
 move.__doc__ = prunerr.runner.PrunerrRunner.move.__doc__
@@ -114,10 +181,12 @@ parser_move.set_defaults(command=move)
 def review(  # pylint: disable=missing-function-docstring,missing-return-doc
     runner,
     *args,
+    profile_operations=False,
     **kwargs,
-) -> dict:
+) -> typing.Optional[dict]:
+    runner.profile_operations = profile_operations
     runner.update()
-    return runner.review(*args, **kwargs)
+    return add_operations_profile(runner, runner.review(*args, **kwargs))
 
 
 review.__doc__ = prunerr.runner.PrunerrRunner.review.__doc__
@@ -129,15 +198,18 @@ parser_review = subparsers.add_parser(
 # Make the function for the sub-command specified in the CLI argument available in the
 # argument parser for delegation below.
 parser_review.set_defaults(command=review)
+add_profile_operations_argument(parser_review)
 
 
 def free_space(  # pylint: disable=missing-function-docstring,missing-return-doc
     runner,
     *args,
+    profile_operations=False,
     **kwargs,
-) -> dict:
+) -> typing.Optional[dict]:
+    runner.profile_operations = profile_operations
     runner.update()
-    return runner.free_space(*args, **kwargs)
+    return add_operations_profile(runner, runner.free_space(*args, **kwargs))
 
 
 free_space.__doc__ = prunerr.runner.PrunerrRunner.free_space.__doc__
@@ -147,25 +219,32 @@ parser_free_space = subparsers.add_parser(
     description=free_space.__doc__.strip(),  # type: ignore
 )
 parser_free_space.set_defaults(command=free_space)
+add_profile_operations_argument(parser_free_space)
 
 
 def exec_(  # pylint: disable=missing-function-docstring,missing-return-doc
     runner,
     *args,
+    profile_operations=False,
+    profile=None,
     **kwargs,
 ) -> typing.Optional[dict]:
+    runner.profile_operations = profile_operations
+    runner.profiler.directory = profile
     runner.update()
     results = {}
-    if (exec_results := runner.exec_(*args, **kwargs)) is not None:
+    with runner.tracer.trace("exec"):
+        exec_results = runner.profiler.run(runner.exec_, *args, **kwargs)
+    if exec_results is not None:
         results.update(exec_results)
+    # Wait for all moving items to finish when doing a single `exec` run.
+    runner.wait_moves()
 
     # Wait for all verifying torrents to finish when doing a single `exec` run.
     if resume_results := runner.resume_verified_items(wait=True):
         results["verify"] = resume_results
 
-    if results:
-        return results
-    return None  # pragma: no cover
+    return add_operations_profile(runner, results) or None
 
 
 exec_.__doc__ = prunerr.runner.PrunerrRunner.exec_.__doc__
@@ -175,9 +254,17 @@ parser_exec = subparsers.add_parser(
     description=exec_.__doc__.strip(),  # type: ignore
 )
 parser_exec.set_defaults(command=exec_)
+add_profile_operations_argument(parser_exec)
+add_profile_argument(parser_exec)
 
 
-def daemon(runner, *args, **kwargs):  # pylint: disable=missing-function-docstring
+def daemon(  # pylint: disable=missing-function-docstring
+    runner,
+    *args,
+    profile=None,
+    **kwargs,
+):
+    runner.profiler.directory = profile
     runner.daemon(*args, **kwargs)
 
 
@@ -188,6 +275,7 @@ parser_daemon = subparsers.add_parser(
     description=daemon.__doc__.strip(),  # type: ignore
 )
 parser_daemon.set_defaults(command=daemon)
+add_profile_argument(parser_daemon)
 # Register shell tab completion
 argcomplete.autocomplete(parser)
 
@@ -230,6 +318,9 @@ def config_cli_logging(
     logging.getLogger(prunerr.servarr.__name__).addFilter(
         utils.daemon_once_filter,
     )
+    logging.getLogger(prunerr.deleter.__name__).addFilter(
+        utils.daemon_once_filter,
+    )
 
     # Avoid logging all JSON responses, particularly the very large history responses
     # from Servarr APIs
@@ -279,14 +370,20 @@ def _main(args=None):
     # Configure logging for command-line usage:
     config_cli_logging(**shared_kwargs)
     shared_kwargs.pop("log_level", None)
+    stats = shared_kwargs.pop("stats", False)
 
     runner = prunerr.runner.PrunerrRunner(**shared_kwargs)
     # Delegate to the function for the subcommand command-line argument:
     logger.debug("Running %r subcommand", parsed_args.command.__name__)
     # subcommands can return a result to pretty print, or handle output themselves and
     # return nothing:
-    if (result := parsed_args.command(runner, **command_kwargs)) is not None:
+    result = parsed_args.command(runner, **command_kwargs)
+    if stats:
+        result = dict(result or {}, stats=runner.metrics.rpc_stats())
+    if result is not None:
         json.dump(result, sys.stdout, indent=2)
+    # Don't exit until any background deletions have finished.
+    runner.deleter.wait()
 
 
 main.__doc__ = __doc__
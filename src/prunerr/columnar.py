@@ -0,0 +1,226 @@
+# SPDX-FileCopyrightText: 2023 Ross Patterson <me@rpatterson.net>
+# SPDX-License-Identifier: MIT
+
+# pylint: disable=magic-value-comparison,missing-any-param-doc,missing-param-doc
+# pylint: disable=missing-raises-doc,missing-return-doc,missing-return-type-doc
+# pylint: disable=missing-type-doc
+
+"""
+Evaluate indexer operations for all download items at once as NumPy arrays.
+
+Optional, only used if NumPy is installed, e.g. `pip install prunerr[columnar]`.
+"""
+
+import time
+import logging
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+# Download item attributes that return a field's value under a different name
+FIELD_NAMES = {
+    "ratio": "uploadRatio",
+    "size_when_done": "sizeWhenDone",
+}
+
+
+def exec_indexer_columns(operations, items, operations_type="priorities"):
+    """
+    Evaluate the indexer operations for all the items, one array per operation.
+
+    Operations that can't be vectorized are evaluated item by item into an array.
+    Return `None` if any operation values aren't numbers or booleans so that the caller
+    can fall back to evaluating and sorting item by item.
+
+    :return: An array of whether to include each item and the indexes of the items in
+        the same order as sorting by their keys in reverse
+    """
+    if numpy is None or not items:
+        return None
+    indexer_groups = {}
+    for item_idx, item in enumerate(items):
+        indexer_idx, indexer_config = operations.get_indexer_config(
+            item.trackers,
+            operations_type,
+        )
+        indexer_groups.setdefault(indexer_idx, (indexer_config, []))[1].append(
+            item_idx,
+        )
+
+    includes = numpy.ones(len(items), dtype=bool)
+    order = []
+    # The indexer index is the first element of each item's key
+    for indexer_idx in sorted(indexer_groups, reverse=True):
+        indexer_config, item_idxs = indexer_groups[indexer_idx]
+        if (
+            columns := exec_operations_columns(
+                operations,
+                indexer_config["operations"],
+                [items[item_idx] for item_idx in item_idxs],
+            )
+        ) is None:
+            return None
+        group_includes, sort_columns = columns
+        includes[item_idxs] = group_includes
+        # `numpy.lexsort()` is stable, ascending, and sorts by the last key first
+        group_order = (
+            numpy.lexsort([0 - sort_column for sort_column in reversed(sort_columns)])
+            if sort_columns
+            else numpy.arange(len(item_idxs))
+        )
+        order.extend(item_idxs[group_idx] for group_idx in group_order)
+    return includes, order
+
+
+def exec_operations_columns(operations, operation_configs, items):
+    """
+    Execute each of the operations for all the items, the same as `exec_operations()`.
+    """
+    includes = numpy.ones(len(items), dtype=bool)
+    sort_columns = []
+    for operation_config in operation_configs:
+        if (
+            column := exec_operation_column(operations, operation_config, items)
+        ) is None:
+            return None
+        if (applied := apply_sort_column(operation_config, includes, column)) is None:
+            return None
+        includes, column = applied
+        sort_columns.append(column)
+    return includes, sort_columns
+
+
+def exec_operation_column(operations, operation_config, items):
+    """
+    Return the array of the operation's values for all the items.
+
+    Fall back to executing the operation item by item if it can't be vectorized.
+    """
+    column = None
+    if operation_config["type"] == "value":
+        column = get_value_column(operation_config["name"], items)
+    elif operation_config["type"] in {"or", "and"}:
+        if (
+            nested_columns := exec_operations_columns(
+                operations,
+                operation_config["operations"],
+                items,
+            )
+        ) is None:
+            return None
+        _, nested_columns = nested_columns
+        if not nested_columns:
+            column = numpy.zeros(len(items))
+        else:
+            # Use the first nested value that's true for `or` or false for `and`,
+            # otherwise the last nested value
+            column = numpy.select(
+                [
+                    (
+                        nested_column.astype(bool)
+                        if operation_config["type"] == "or"
+                        else ~nested_column.astype(bool)
+                    )
+                    for nested_column in nested_columns
+                ],
+                nested_columns,
+                default=nested_columns[-1],
+            )
+
+    if column is None:
+        if (
+            executor := getattr(
+                operations,
+                f"exec_operation_{operation_config['type']}",
+                None,
+            )
+        ) is None:
+            return None
+        values = [executor(operation_config, item) for item in items]
+        if not all(isinstance(value, (bool, int, float)) for value in values):
+            return None
+        column = numpy.array(values, dtype=float)
+    return column
+
+
+def get_value_column(name, items):
+    """
+    Return an array of the attribute values for all the items from their fields.
+
+    Return `None` for attributes that aren't simple fields.
+    """
+    # Share the same current time for all items
+    now = time.time()
+    fields = [item._fields for item in items]  # pylint: disable=protected-access
+    if name == "age":
+        return now - numpy.array(
+            [item_fields["addedDate"].value for item_fields in fields],
+            dtype=float,
+        )
+    if name == "seconds_since_done":
+        # Only the simple case, the rest requires the fallbacks and warnings
+        done_dates = numpy.array(
+            [item_fields["doneDate"].value for item_fields in fields],
+            dtype=float,
+        )
+        if (
+            not all(
+                not item_fields["leftUntilDone"].value
+                and item_fields["percentDone"].value >= 1
+                for item_fields in fields
+            )
+            or not (done_dates > 0).all()
+        ):
+            return None
+        return now - done_dates
+
+    if name in FIELD_NAMES:
+        field_name = FIELD_NAMES[name]
+    elif hasattr(type(items[0]), name):
+        # A property or other attribute that may differ from the field value
+        return None
+    else:
+        field_name = name
+    values = [
+        item_fields[field_name].value if field_name in item_fields else None
+        for item_fields in fields
+    ]
+    if not all(isinstance(value, (bool, int, float)) for value in values):
+        return None
+    return numpy.array(values, dtype=float)
+
+
+def apply_sort_column(operation_config, includes, column):
+    """
+    Apply the restrictions for all the items, the same as `apply_sort_value()`.
+
+    Return `None` if the restrictions can't be applied to numbers.
+    """
+    if "equals" in operation_config:
+        if "minimum" in operation_config or "maximum" in operation_config:
+            raise ValueError(
+                f"Operation {operation_config['type']!r} "
+                f"includes both `equals` and `minimum` or `maximum`"
+            )
+        if not isinstance(operation_config["equals"], (bool, int, float)):
+            return None
+        column = column == operation_config["equals"]
+    else:
+        sort_bool = None
+        if "minimum" in operation_config:
+            sort_bool = column >= operation_config["minimum"]
+        if "maximum" in operation_config:
+            maximum_bool = column <= operation_config["maximum"]
+            sort_bool = maximum_bool if sort_bool is None else sort_bool & maximum_bool
+        if sort_bool is not None:
+            column = sort_bool
+    column = column.astype(float)
+    if operation_config.get("filter", False):
+        includes = includes & column.astype(bool)
+    if operation_config.get("reversed", False):
+        column = 0 - column
+    return includes, column
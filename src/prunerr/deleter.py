@@ -0,0 +1,376 @@
+# SPDX-FileCopyrightText: 2023 Ross Patterson <me@rpatterson.net>
+# SPDX-License-Identifier: MIT
+
+# pylint: disable=missing-any-param-doc,missing-param-doc,missing-return-doc
+# pylint: disable=missing-return-type-doc,missing-type-doc
+
+"""
+Delete download item files in the background to avoid blocking the daemon loop.
+"""
+
+import os
+import stat
+import time
+import platform
+import functools
+import threading
+import collections
+import concurrent.futures
+import contextvars
+import ctypes
+import ctypes.util
+import json
+import logging
+
+import prunerr.downloadclient
+import prunerr.tracing
+from .utils import pathlib
+
+logger = logging.getLogger(__name__)
+
+# The `ioprio_set` syscall isn't exposed by the standard library, use the syscall
+# number for the platform:
+# https://man7.org/linux/man-pages/man2/ioprio_set.2.html
+IOPRIO_SET_SYSCALLS = {
+    "x86_64": 251,
+    "i386": 289,
+    "i686": 289,
+    "aarch64": 30,
+    "armv7l": 314,
+    "ppc64le": 273,
+    "s390x": 282,
+}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+
+
+class PrunerrDeleter:  # pylint: disable=too-many-instance-attributes
+    """
+    Delete files on worker threads with a limit on concurrent deletions per device.
+
+    Deleting the files of very large download items, such as season packs, can block
+    for a long time and starve the download client's disk I/O.  When configured with
+    workers, paths are deleted in the background while the rest of the order of
+    operations proceeds.  Deletions beyond the limit for a device wait in a queue for
+    that device instead of occupying workers, so that they don't delay deletions on
+    other devices.  The sizes of pending deletions are counted as free space until the
+    download client sessions are refreshed after the deletion completes.
+    Pending deletions are recorded in a journal so that they resume after a restart.
+    Without workers, paths are deleted immediately as before.
+    """
+
+    executor = None
+
+    def __init__(self, runner):
+        """
+        Capture a reference to the runner and initialize the pending deletions.
+        """
+        self.runner = runner
+        self.config = {}
+        self.lock = threading.Lock()
+        # Map `st_dev` to the deletions waiting for a worker and the number running
+        self.device_queues = {}
+        self.device_running = {}
+        # Map `st_dev` to paths to the sizes of deletions not yet reflected in the
+        # download client sessions' free space
+        self.pending = {}
+        self.completed = {}
+        self.futures = {}
+
+    def __repr__(self):
+        """
+        Readable, informative, and specific representation to ease debugging.
+        """
+        return f"<{type(self).__name__} workers={self.config.get('workers')!r}>"
+
+    def update(self, config):
+        """
+        Update configuration, start the workers, and resume any journaled deletions.
+        """
+        self.config = config
+        if self.config["workers"] and self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.config["workers"],
+                thread_name_prefix="prunerr-deleter",
+                initializer=(
+                    set_idle_io_priority if config["idle-io-priority"] else None
+                ),
+            )
+            for path, size in self.read_journal().items():
+                if os.path.lexists(path):
+                    logger.info("Resuming interrupted deletion: %r", path)
+                    self.submit(pathlib.Path(path), size)
+                else:
+                    logger.debug("Interrupted deletion already complete: %r", path)
+        return self.executor
+
+    @property
+    def journal_path(self):
+        """
+        Return the path to the file that records pending deletions.
+        """
+        return pathlib.Path(self.config["journal"]).expanduser()
+
+    def read_journal(self):
+        """
+        Return the pending deletions recorded by a previous run, if any.
+        """
+        if not self.journal_path.is_file():
+            return {}
+        with self.journal_path.open(encoding="utf-8") as journal_opened:
+            return json.load(journal_opened)
+
+    def write_journal(self):
+        """
+        Record the current pending deletions, must be called with the lock held.
+        """
+        journal = {
+            path: size
+            for device_pending in self.pending.values()
+            for path, size in device_pending.items()
+        }
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        journal_tmp = self.journal_path.with_suffix(".tmp")
+        with journal_tmp.open("w", encoding="utf-8") as journal_opened:
+            json.dump(journal, journal_opened, indent=2)
+        journal_tmp.replace(self.journal_path)
+
+    def submit(self, path, size):
+        """
+        Delete the given path, in the background if workers are configured.
+
+        Paths already pending deletion aren't submitted again.
+
+        :return: The future for a background deletion, otherwise `None`
+        """
+        if self.executor is None:
+            delete_path(path, self.config)
+            return None
+        with self.lock:
+            if str(path) in self.futures:
+                return self.futures[str(path)]
+        device = path.lstat().st_dev
+        with self.lock:
+            self.pending.setdefault(device, {})[str(path)] = size
+            self.write_journal()
+            future = self.futures[str(path)] = concurrent.futures.Future()
+            # Nest the background deletion in the span that submitted it, if tracing
+            self.device_queues.setdefault(device, collections.deque()).append(
+                (contextvars.copy_context(), path, future),
+            )
+            self.start_device(device)
+        return future
+
+    def start_device(self, device):
+        """
+        Hand queued deletions to the workers up to the limit for the device.
+
+        Must be called with the lock held.
+        """
+        device_queue = self.device_queues[device]
+        while (  # pylint: disable=while-used
+            device_queue
+            and self.device_running.get(device, 0) < self.config["per-device"]
+        ):
+            context, path, future = device_queue.popleft()
+            self.device_running[device] = self.device_running.get(device, 0) + 1
+            self.executor.submit(context.run, self.delete, device, path, future)
+
+    def delete(self, device, path, future):
+        """
+        Delete the path on a worker thread and start the next deletion on the device.
+        """
+        deleted = False
+        try:
+            delete_path(
+                path,
+                self.config,
+                functools.partial(self.free, device, str(path)),
+            )
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Error deleting %r in the background", str(path))
+        else:
+            deleted = True
+            logger.debug("Finished deleting %r in the background", str(path))
+        with self.lock:
+            if deleted:
+                # Still count the size as free space until the sessions are refreshed
+                self.move_completed(device, str(path))
+            else:
+                # Only space actually freed so far, e.g. by truncating, is counted
+                del self.pending[device][str(path)]
+            del self.futures[str(path)]
+            self.write_journal()
+            self.device_running[device] -= 1
+            self.start_device(device)
+        future.set_result(deleted)
+
+    def free(self, device, path, size):
+        """
+        Count space freed so far by a pending deletion, e.g. truncation progress.
+        """
+        with self.lock:
+            self.move_completed(device, path, size)
+
+    def move_completed(self, device, path, size=None):
+        """
+        Move freed space from pending to completed, must be called with the lock held.
+
+        Move all the pending space and stop tracking the pending deletion if no size is
+        given.
+        """
+        device_pending = self.pending[device]
+        if size is None:
+            size = device_pending.pop(path)
+        else:
+            size = min(size, device_pending[path])
+            device_pending[path] -= size
+        device_completed = self.completed.setdefault(device, {})
+        device_completed[path] = device_completed.get(path, 0) + size
+
+    def get_pending_paths(self):
+        """
+        Return the paths of deletions that haven't finished yet.
+        """
+        with self.lock:
+            return {
+                pathlib.Path(path)
+                for path in self.futures.keys()
+                | {
+                    path
+                    for device_pending in self.pending.values()
+                    for path in device_pending
+                }
+            }
+
+    def pending_size(self, path):
+        """
+        Return the size of deletions not yet reflected on the given path's filesystem.
+        """
+        if not self.pending and not self.completed:
+            return 0
+        device = os.stat(path).st_dev
+        with self.lock:
+            return sum(self.pending.get(device, {}).values()) + sum(
+                self.completed.get(device, {}).values(),
+            )
+
+    def get_completed(self):
+        """
+        Return a copy of the completed deletions, call just before refreshing sessions.
+        """
+        with self.lock:
+            return {
+                device: dict(device_completed)
+                for device, device_completed in self.completed.items()
+            }
+
+    def forget_completed(self, completed):
+        """
+        Stop counting the given completed deletions, call after refreshing sessions.
+
+        Only the deletions completed before refreshing, as returned by
+        `get_completed()`, are reflected in the refreshed free space.  Any space freed
+        since is still counted.
+        """
+        with self.lock:
+            for device, device_completed in completed.items():
+                current_completed = self.completed.get(device, {})
+                for path, size in device_completed.items():
+                    if current_completed.get(path, 0) > size:
+                        current_completed[path] -= size
+                    else:
+                        current_completed.pop(path, None)
+                if not current_completed:
+                    self.completed.pop(device, None)
+
+    def wait(self):
+        """
+        Block until all background deletions have completed.
+        """
+        with self.lock:
+            futures = list(self.futures.values())
+        concurrent.futures.wait(futures)
+        return futures
+
+
+def delete_path(path, config, freed=None):
+    """
+    Delete the path, first truncating any large files in chunks if configured.
+
+    Unlinking very large files can stall the filesystem for seconds.  Shrinking them
+    gradually releases the space smoothly.  Files with other hard links, such as those
+    imported by Servarr, free no space and truncating them would destroy the other
+    copies, so they are only unlinked.
+    """
+    with prunerr.tracing.span("delete", path=path):
+        if config.get("truncate-min-size"):
+            file_paths = [path]
+            if path.is_dir():
+                file_paths = [
+                    pathlib.Path(dirpath, filename)
+                    for dirpath, _, filenames in os.walk(path)
+                    for filename in filenames
+                ]
+            for file_path in file_paths:
+                truncate_file(file_path, config, freed)
+        return prunerr.downloadclient.delete_path(path)
+
+
+def truncate_file(file_path, config, freed=None):
+    """
+    Truncate a large file in chunks, pausing between each, and report the space freed.
+
+    :return: The number of bytes freed by truncating
+    """
+    file_stat = file_path.lstat()
+    if (
+        not stat.S_ISREG(file_stat.st_mode)
+        or file_stat.st_nlink > 1
+        or file_stat.st_size < config["truncate-min-size"]
+    ):
+        return 0
+    logger.debug("Truncating %r before deleting", str(file_path))
+    size = file_stat.st_size
+    while size:  # pylint: disable=while-used
+        chunk_size = min(size, config["truncate-chunk-size"])
+        size -= chunk_size
+        os.truncate(file_path, size)
+        if freed is not None:
+            freed(chunk_size)
+        if size:
+            time.sleep(config["truncate-pause"])
+    return file_stat.st_size
+
+
+def set_idle_io_priority():
+    """
+    Lower the I/O priority of the current worker thread to idle where supported.
+
+    Linux only, the I/O scheduler must support priorities, e.g. BFQ, for any effect.
+    """
+    if (syscall_number := IOPRIO_SET_SYSCALLS.get(platform.machine())) is None:
+        logger.debug(
+            "Setting I/O priority not supported on this platform: %s",
+            platform.machine(),
+        )
+        return False
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    # A `who` of 0 is the calling thread
+    if (
+        libc.syscall(
+            syscall_number,
+            IOPRIO_WHO_PROCESS,
+            0,
+            IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT,
+        )
+        != 0
+    ):
+        errno = ctypes.get_errno()
+        logger.warning(
+            "Could not set idle I/O priority for deleting: %s",
+            os.strerror(errno),
+        )
+        return False
+    return True
@@ -3,27 +3,68 @@
 
 # pylint: disable=magic-value-comparison,missing-any-param-doc,missing-param-doc
 # pylint: disable=missing-raises-doc,missing-return-doc,missing-return-type-doc
-# pylint: disable=missing-type-doc
+# pylint: disable=missing-type-doc,too-many-instance-attributes,too-many-public-methods
 
 """
 Prunerr interaction with download clients.
 """
 
 import re
+import heapq
 import shutil
 import urllib.parse
+import json
 import logging
 
 import transmission_rpc
 
 import prunerr.downloaditem
 import prunerr.operations
+import prunerr.mover
+import prunerr.verifier
+import prunerr.columnar
+import prunerr.metrics
+import prunerr.tracing
 from . import utils
 from .utils import pathlib
+from .utils import cached_property
 
 logger = logging.getLogger(__name__)
 
 
+class PrunerrTransmissionClient(transmission_rpc.client.Client):
+    """
+    Record metrics for every request to the Transmission RPC API.
+
+    Includes the request the RPC client library sends when connecting.
+    """
+
+    responses = None
+
+    def __init__(self, *args, metrics=None, **kwargs):
+        """
+        Capture the metrics to record requests in before connecting.
+        """
+        self.metrics = metrics
+        super().__init__(*args, **kwargs)
+
+    def _http_query(self, query, timeout=None):
+        """
+        Count, time, and measure the responses to the request by RPC method.
+
+        Requests the RPC client library sends again for a new session ID are counted
+        as retries.
+        """
+        if self.metrics is None:
+            return super()._http_query(query, timeout)
+        if self.responses is None:
+            # The HTTP session only exists once the RPC client library has started
+            # connecting
+            self.responses = prunerr.metrics.PrunerrRPCResponses(self._http_session)
+        with self.metrics.rpc("transmission", query["method"], self.responses):
+            return super()._http_query(query, timeout)
+
+
 class PrunerrDownloadClient:
     """
     An individual, specific download client that Prunerr interacts with.
@@ -32,10 +73,10 @@ class PrunerrDownloadClient:
     # TODO: Make configurable?
     SEEDING_DIR_BASENAME = "seeding"
     UNREGISTERED_ERROR_RE = re.compile(r".*(not |un)registered.*")
-
     client = None
-    items = None
+    records = None
     operations = None
+    operations_profile = None
 
     def __init__(self, runner):
         """
@@ -44,7 +85,15 @@ class PrunerrDownloadClient:
         self.runner = runner
         self.config = {}
         self.servarrs = {}
-        self.verifying_items = {}
+        self.review_values = {}
+        self.review_changes = {}
+        self.operations_memo = {}
+        self.download_dir_devices = {}
+        self.resolved_dirs = {}
+        self.dir_records = {}
+        self.download_dirs_managed_dirs = {}
+        self.mover = prunerr.mover.PrunerrMover(self)
+        self.verifier = prunerr.verifier.PrunerrVerifier(self)
 
     def __repr__(self):
         """
@@ -52,6 +101,7 @@ class PrunerrDownloadClient:
         """
         return f"<{type(self).__name__} at {self.config.get('name')!r}>"
 
+    @prunerr.tracing.traced
     def update(self, config):
         """
         Update configuration, connect the RPC client, and update the list of items.
@@ -76,6 +126,18 @@ class PrunerrDownloadClient:
             "min-download-time-margin",
             example_confg["min-download-time-margin"],
         )
+        self.config.setdefault(
+            "max-verifying-per-device",
+            example_confg["max-verifying-per-device"],
+        )
+        self.config.setdefault(
+            "max-move-chunk-size",
+            example_confg["max-move-chunk-size"],
+        )
+        self.config.setdefault(
+            "operations-memo-seconds",
+            example_confg["operations-memo-seconds"],
+        )
 
         self.config.setdefault(
             "password",
@@ -85,6 +147,9 @@ class PrunerrDownloadClient:
 
         # Configuration specific to Prunerr, IOW not taken from the download client
         self.config["min-free-space"] = calc_free_space_margin(self.config)
+        if self.runner.profile_operations and self.operations_profile is None:
+            # Keep the same profile across updates
+            self.operations_profile = prunerr.operations.PrunerrOperationsProfile()
         self.operations = prunerr.operations.PrunerrOperations(
             self,
             self.runner.config.get("indexers", {}),
@@ -106,7 +171,8 @@ class PrunerrDownloadClient:
             "Connecting to download client: %s",
             self.config["url"],
         )
-        self.client = transmission_rpc.client.Client(
+        self.client = PrunerrTransmissionClient(
+            metrics=self.runner.metrics,
             protocol=split_url.scheme,
             host=split_url.hostname,
             port=port,
@@ -137,70 +203,388 @@ class PrunerrDownloadClient:
             "Retrieving list of download items from download client: %s",
             self.config["url"],
         )
-        self.items = [
-            prunerr.downloaditem.PrunerrDownloadItem(
-                self,
-                torrent._client,  # pylint: disable=protected-access
-                torrent,
-            )
+        # Only materialize the full download items as filtering selects them.
+        vars(self).pop("items", None)
+        # Symbolic links may have changed since the last update
+        self.resolved_dirs.clear()
+        self.download_dir_devices.clear()
+        # Queued corrupt items may be verified again in a later update
+        self.verifier.verify_started.clear()
+        self.records = [
+            prunerr.downloaditem.PrunerrDownloadItemRecord(self, torrent)
             # TODO: Reduce memory consumption, narrow the list of fields requested for
             # all items.  Maybe also have separate sets of fields for operations done
             # on the whole list of items (e.g. filtering to find seeding items) and
             # operations on individual torrents (e.g. review).
             for torrent in self.client.get_torrents()
         ]
-        return self.items
+        # Forget memoized operation results for items no longer in the download client
+        item_hashes = {record.hashString for record in self.records}
+        for memo_key in [
+            memo_key
+            for memo_key in self.operations_memo
+            if memo_key[0] not in item_hashes
+        ]:
+            del self.operations_memo[memo_key]
+        self.index_records()
+        statuses = {}
+        for record in self.records:
+            statuses[record.status] = statuses.get(record.status, 0) + 1
+        self.runner.metrics.clear("prunerr_items", download_client=self.config["url"])
+        for status, status_count in statuses.items():
+            self.runner.metrics.set(
+                "prunerr_items",
+                status_count,
+                download_client=self.config["url"],
+                status=status,
+            )
+        # Moves requested in a previous daemon loop may have finished since
+        self.mover.reconcile_moves()
+        return self.records
+
+    @cached_property
+    def items(self):
+        """
+        Materialize the full download items for all records.
+
+        Prefer filtering ``self.records`` for operations that only act on some items.
+        """
+        return [record.item for record in self.records]
 
     # Sub-commands
 
     def review(self, servarr_queue):
         """
         Apply configured review operations to all download items.
+
+        Review incrementally across daemon loops: the value of each operation is reused
+        until the item fields it reads change.  Time dependent operations, such as
+        `age`, are always re-evaluated.
         """
         # TODO: Maybe handle multiple downloading items for the
         # same Servarr item such as when trying several to see which
         # ones actually have decent download speeds?
         results = {}
+        removed_items = []
         # Need to make a copy in case review leads to deleting an item and modifying
-        # `self.items`.
-        download_dir = pathlib.Path(self.client.session.download_dir)
-        for item in [item for item in self.items if download_dir in item.path.parents]:
+        # `self.dir_records`.
+        records = list(self.dir_records[pathlib.Path(self.client.session.download_dir)])
+        # Forget operation values for items no longer under review
+        for item_hash in self.review_values.keys() - {
+            record.hashString for record in records
+        }:
+            del self.review_values[item_hash]
+        unchanged = 0
+        for record in records:
+            # Only review items for which some operation reads fields that changed
+            # since the previous review or is time dependent.
+            fingerprints = self.operations.fingerprint_indexer_operations(
+                record,
+                queue_id=servarr_queue.get(record.hashString.upper(), {}).get("id"),
+            )
+            cached_values = self.review_values.setdefault(record.hashString, {})
+            if None not in fingerprints and all(
+                cached_values.get(operation_idx, (None, None))[0] == fingerprint
+                for operation_idx, fingerprint in enumerate(fingerprints)
+            ):
+                unchanged += 1
+                continue
+            item = record.item
             item_results = None
             try:
-                item_results = item.review(servarr_queue)
+                item_results = item.review(servarr_queue, fingerprints, cached_values)
             except utils.RETRY_EXC_TYPES:
                 logger.exception(
                     "Error reviewing item: %s",
                     item,
                 )
             if item_results:
+                # Review again in full after acting on the item, e.g. retry removals
+                del self.review_values[item.hashString]
                 results[item.hashString] = item_results
+                if item_results[-1].get("remove", False):
+                    removed_items.append(item)
+        if unchanged:
+            logger.debug("Skipped reviewing %s unchanged download items", unchanged)
+        return self.review_apply(results, removed_items, servarr_queue)
+
+    def review_apply(self, results, removed_items, servarr_queue):
+        """
+        Apply the changes and removals queued by reviewing all download items in bulk.
+        """
+        if self.review_changes:
+            self.review_apply_changes(results)
+        if removed_items:
+            self.review_remove_items(removed_items, servarr_queue, results)
         return results
 
+    def queue_change(self, item, change):
+        """
+        Queue a review change to apply together with the same change to other items.
+        """
+        self.review_changes.setdefault(
+            json.dumps(change, sort_keys=True),
+            (change, []),
+        )[1].append(item)
+
+    def review_apply_changes(self, results):
+        """
+        Apply each distinct queued review change to all its items in one RPC request.
+
+        Update the local item fields from the change itself instead of retrieving the
+        items again, under the same field names and values the RPC client library sends.
+        Changes that fail are dropped from the results so that they're retried on the
+        next review.
+        """
+        changes, self.review_changes = self.review_changes, {}
+        for change, items in changes.values():
+            try:
+                self.client.change_torrent(
+                    [item.hashString for item in items],
+                    **change,
+                )
+            except utils.RETRY_EXC_TYPES:
+                logger.exception(
+                    "Error changing download items %s:\n  %s",
+                    json.dumps(change),
+                    "\n  ".join(repr(item) for item in items),
+                )
+                for item in items:
+                    results[item.hashString].remove(change)
+                    if not results[item.hashString]:
+                        del results[item.hashString]
+                continue
+            fields = dict(
+                transmission_rpc.utils.argument_value_convert(
+                    "torrent-set",
+                    transmission_rpc.utils.make_rpc_name(key),
+                    value,
+                    self.client.rpc_version,
+                )
+                for key, value in change.items()
+            )
+            for item in items:
+                item._update_fields(fields)  # pylint: disable=protected-access
+        return changes
+
+    def review_remove_items(self, removed_items, servarr_queue, results):
+        """
+        Remove the reviewed download items from Servarr and the download client in bulk.
+
+        Delete the Servarr queue records with one request per Servarr instance and
+        blocklist option and remove the download items with one RPC request.  Items
+        whose Servarr queue records couldn't be deleted are left for the next review and
+        only their removal is dropped from the results.
+        """
+        queue_deletes = {}
+        deleted_hashes = set()
+        for item in removed_items:
+            if queue_record := servarr_queue.get(item.hashString.upper()):
+                queue_deletes.setdefault(
+                    (
+                        queue_record["servarr"],
+                        results[item.hashString][-1].get("blacklist", False),
+                    ),
+                    [],
+                ).append((item, queue_record["id"]))
+            else:
+                deleted_hashes.add(item.hashString)
+        for (servarr, blocklist), queue_items in queue_deletes.items():
+            try:
+                servarr.delete_queue_records(
+                    [queue_id for _, queue_id in queue_items],
+                    blocklist=blocklist,
+                )
+            except utils.RETRY_EXC_TYPES:
+                logger.exception(
+                    "Error removing items from %s queue:\n  %s",
+                    servarr.config["name"],
+                    "\n  ".join(repr(item) for item, _ in queue_items),
+                )
+                # Still report the other review changes already applied
+                for item, _ in queue_items:
+                    results[item.hashString].pop()
+                    if not results[item.hashString]:
+                        del results[item.hashString]
+                continue
+            deleted_hashes.update(item.hashString for item, _ in queue_items)
+        return self.delete_items(
+            [item for item in removed_items if item.hashString in deleted_hashes],
+        )
+
     # Other, non-sub-command methods
 
-    def sort_items_by_tracker(self, items):
+    def sort_items_by_tracker(self, items, filtered=False):
         """
         Sort the given download items according to the indexer priority operations.
+
+        Evaluate the operations for all items at once if NumPy is installed and not
+        profiling operations.  If `filtered`, exclude the items the operations filter
+        out.
         """
-        return sorted(
+        items = list(items)
+        if self.operations.profile is None and (
+            columns := prunerr.columnar.exec_indexer_columns(self.operations, items)
+        ):
+            includes, order = columns
+            return [
+                items[item_idx]
+                for item_idx in order
+                if not filtered or includes[item_idx]
+            ]
+        if filtered:
+            items = [
+                item
+                for item in items
+                if self.operations.exec_indexer_operations(item)[0]
+            ]
+        sorted_items = sorted(
             items,
             # remove lowest priority and highest ratio first
             key=lambda item: self.operations.exec_indexer_operations(item)[1],
             reverse=True,
         )
+        if self.operations.profile is not None:
+            self.operations.profile.explain_order(
+                sorted_items,
+                lambda item: self.operations.exec_indexer_operations(item)[1],
+            )
+        return sorted_items
+
+    def queue_items_by_tracker(self, items, filtered=False):
+        """
+        Queue the given download items in the same order as `sort_items_by_tracker()`.
+
+        Use when only the first few items in order are needed, the rest are never
+        ordered.  If NumPy is installed, all items are ordered at once instead unless
+        profiling operations.
+        """
+        items = list(items)
+        if self.operations.profile is None and (
+            columns := prunerr.columnar.exec_indexer_columns(self.operations, items)
+        ):
+            includes, order = columns
+            # Already in order and equal keys are popped in the order given
+            return PrunerrItemQueue(
+                (
+                    items[item_idx]
+                    for item_idx in order
+                    if not filtered or includes[item_idx]
+                ),
+                key=lambda item: 0,
+            )
+        if filtered:
+            items = [
+                item
+                for item in items
+                if self.operations.exec_indexer_operations(item)[0]
+            ]
+        if self.operations.profile is not None:
+            # Explain the full order even though the queue may not be fully consumed
+            self.operations.profile.explain_order(
+                sorted(
+                    items,
+                    key=lambda item: self.operations.exec_indexer_operations(item)[1],
+                    reverse=True,
+                ),
+                lambda item: self.operations.exec_indexer_operations(item)[1],
+            )
+        return PrunerrItemQueue(
+            items,
+            # remove lowest priority and highest ratio first
+            key=lambda item: self.operations.exec_indexer_operations(item)[1],
+        )
+
+    @property
+    def seeding_dir(self):
+        """
+        Return the directory parallel to the download directory for seeding items.
+        """
+        return (
+            pathlib.Path(self.client.session.download_dir).parent
+            / self.SEEDING_DIR_BASENAME
+        )
+
+    def index_records(self):
+        """
+        Bucket download item records by the managed directories that contain them.
+
+        The managed directories are the download client's download and seeding
+        directories and each Servarr instance's download and seeding directories.  Each
+        phase can then iterate only the records in the directory it acts on.  Rebuild
+        whenever items change directories.
+        """
+        self.dir_records = {
+            pathlib.Path(self.client.session.download_dir): [],
+            self.seeding_dir: [],
+        }
+        for servarr in self.servarrs.values():
+            self.dir_records.setdefault(servarr.download_dir, [])
+            self.dir_records.setdefault(servarr.seeding_dir, [])
+        self.download_dirs_managed_dirs.clear()
+        for record in self.records:
+            for managed_dir in self.get_managed_dirs(record.downloadDir):
+                self.dir_records[managed_dir].append(record)
+        return self.dir_records
+
+    def get_managed_dirs(self, download_dir):
+        """
+        Return the managed directories that contain the given download directory.
+
+        Equivalent to checking if each managed directory is in the parents of each item
+        path but only done once for all items that share the same download directory.
+        """
+        if (managed_dirs := self.download_dirs_managed_dirs.get(download_dir)) is None:
+            resolved_dir = self.resolve_dir(download_dir)
+            parents = {resolved_dir}
+            parents.update(resolved_dir.parents)
+            managed_dirs = self.download_dirs_managed_dirs[download_dir] = tuple(
+                managed_dir
+                for managed_dir in self.dir_records
+                if managed_dir in parents
+            )
+        return managed_dirs
+
+    def resolve_dir(self, download_dir):
+        """
+        Resolve a download directory once for all download items that share it.
+        """
+        if (resolved_dir := self.resolved_dirs.get(download_dir)) is None:
+            resolved_dir = self.resolved_dirs[download_dir] = pathlib.Path(
+                download_dir,
+            ).resolve()
+        return resolved_dir
+
+    def forget_resolved_dirs(self, *changed_dirs):
+        """
+        Clear resolved download directories at or under the given changed directories.
+
+        Compare both the unresolved and resolved paths so that directories are cleared
+        when either they or the targets of symbolic links to them have changed.
+        """
+        changed_dirs = {pathlib.Path(changed_dir) for changed_dir in changed_dirs}
+        changed_dirs.update(changed_dir.resolve() for changed_dir in list(changed_dirs))
+        for download_dir, resolved_dir in list(self.resolved_dirs.items()):
+            for cached_dir in (pathlib.Path(download_dir), resolved_dir):
+                if changed_dirs.intersection((cached_dir,) + tuple(cached_dir.parents)):
+                    del self.resolved_dirs[download_dir]
+                    break
 
     # Methods used by the `free-space` sub-command
 
-    def delete_files(self, item):
+    @prunerr.tracing.traced
+    def delete_items(self, items):
         """
-        Delete all files and directories for the given path and stat or download item.
+        Remove the given download items from the download client and delete their files.
 
-        First remove from the download client if given a download item.
+        Remove all the items with one RPC request and refresh the sessions once after
+        all the files have been deleted.
+
+        :return: Map download item hashes to the size of their deleted files
         """
-        # Handle actual items recognized by the download client
-        if isinstance(item, prunerr.downloaditem.PrunerrDownloadItem):
-            size = item.totalSize
+        if not items:
+            return {}
+        for item in items:
             self.operations.exec_indexer_operations(item)
             logger.info(
                 "Deleting %r, "
@@ -208,9 +592,9 @@ class PrunerrDownloadClient:
                 item,
                 *(
                     transmission_rpc.utils.format_size(
-                        self.client.session.download_dir_free_space,
+                        self.download_dir_free_space,
                     )
-                    + transmission_rpc.utils.format_size(size)
+                    + transmission_rpc.utils.format_size(item.totalSize)
                     + (
                         item.match_indexer_urls(),
                         item.bandwidthPriority,
@@ -218,80 +602,140 @@ class PrunerrDownloadClient:
                     )
                 ),
             )
-            self.client.remove_torrent([item.hashString])
-            self.items.remove(item)
-            path = item.files_parent
+        # Estimate the space freed before deleting the files
+        sizes_unimported = [item.size_unimported for item in items]
+        self.client.remove_torrent([item.hashString for item in items])
+        sizes = {}
+        for item, size_unimported in zip(items, sizes_unimported):
+            self.remove_record(item)
+            self.runner.deleter.submit(item.files_parent, size_unimported)
+            sizes[item.hashString] = item.totalSize
+            self.count_deletion("item", size_unimported)
+        self.refresh_sessions()
+        return sizes
+
+    @prunerr.tracing.traced
+    def delete_files(self, item):
+        """
+        Delete all files and directories for the given path and stat or download item.
+
+        First remove from the download client if given a download item.
+        """
+        # Handle actual items recognized by the download client
+        if isinstance(item, prunerr.downloaditem.PrunerrDownloadItem):
+            return self.delete_items([item])[item.hashString]
 
         # Handle filesystem paths not recognized by the download client
-        else:
-            path, stat = item
-            size = stat.st_size
-            logger.info(
-                "Deleting %r: %0.2f %s + %0.2f %s",
-                str(path),
-                *(
-                    transmission_rpc.utils.format_size(
-                        self.client.session.download_dir_free_space,
-                    )
-                    + transmission_rpc.utils.format_size(size)
-                ),
-            )
+        path, stat = item
+        size = stat.st_size
+        logger.info(
+            "Deleting %r: %0.2f %s + %0.2f %s",
+            str(path),
+            *(
+                transmission_rpc.utils.format_size(
+                    self.download_dir_free_space,
+                )
+                + transmission_rpc.utils.format_size(size)
+            ),
+        )
+        self.runner.deleter.submit(path, size)
+        self.count_deletion("orphan", size)
+        self.refresh_sessions()
+        return size
+
+    def count_deletion(self, kind, size):
+        """
+        Record the deletion and the estimated space it frees in the metrics.
+        """
+        self.runner.metrics.inc(
+            "prunerr_deletions_total",
+            download_client=self.config["url"],
+            kind=kind,
+        )
+        self.runner.metrics.inc(
+            "prunerr_freed_bytes_total",
+            size,
+            download_client=self.config["url"],
+            kind=kind,
+        )
 
-        # Delete the actual files ourselves to workaround Transmission hanging when
-        # deleting the data of large items: e.g. season packs.
-        if path.is_dir():
-            shutil.rmtree(path, onerror=log_rmtree_error)
-        else:
-            path.unlink()
-        if next(path.parent.iterdir(), None) is None:
-            # The directory containging the file is empty
-            path.parent.rmdir()
-
-        # Refresh the sessions data including free space.
+    def refresh_sessions(self):
+        """
+        Refresh the sessions data including free space after deleting files.
+        """
         # TODO: Until we aggregate download client directories by `*.stat().st_dev`, we
         # can't know which of their sessions to update when we delete a path.  Maybe
         # implement?  Premature optimization?
+        # Only background deletions completed before now are reflected in the sessions
+        completed = self.runner.deleter.get_completed()
         for download_client in self.runner.download_clients.values():
             download_client.client.get_session()
+        self.runner.deleter.forget_completed(completed)
 
-        return size
+    @property
+    def download_dir_free_space(self):
+        """
+        Return the free space including deletions still pending in the background.
+        """
+        return (
+            self.client.session.download_dir_free_space
+            + self.runner.deleter.pending_size(self.client.session.download_dir)
+        )
+
+    def remove_record(self, item):
+        """
+        Forget a download item removed from the download client.
+        """
+        self.records = [
+            record for record in self.records if record.hashString != item.hashString
+        ]
+        for managed_dir, dir_records in self.dir_records.items():
+            self.dir_records[managed_dir] = [
+                record for record in dir_records if record.hashString != item.hashString
+            ]
+        if "items" in vars(self):
+            self.items.remove(item)
 
     def free_space_maybe_resume(self):
         """
         Determine if there's sufficient free disk space, resume downloading if paused.
         """
+        self.runner.metrics.set(
+            "prunerr_free_space_bytes",
+            self.download_dir_free_space,
+            download_client=self.config["url"],
+            path=self.client.session.download_dir,
+        )
         total_remaining_download = sum(
-            item.leftUntilDone for item in self.items if item.status == "downloading"
+            record.leftUntilDone
+            for record in self.records
+            if record.status == "downloading"
         )
-        if total_remaining_download > self.client.session.download_dir_free_space:
+        if total_remaining_download > self.download_dir_free_space:
             logger.debug(
                 "Total size of remaining downloads is greater than the available free "
                 "space: %0.2f %s - %0.2f %s = %0.2f %s",
                 *(
                     transmission_rpc.utils.format_size(total_remaining_download)
+                    + transmission_rpc.utils.format_size(self.download_dir_free_space)
                     + transmission_rpc.utils.format_size(
-                        self.client.session.download_dir_free_space
-                    )
-                    + transmission_rpc.utils.format_size(
-                        total_remaining_download
-                        - self.client.session.download_dir_free_space
+                        total_remaining_download - self.download_dir_free_space
                     )
                 ),
             )
-        if self.client.session.download_dir_free_space >= self.config["min-free-space"]:
+        if self.download_dir_free_space >= self.config["min-free-space"]:
             logger.debug(
                 "Sufficient free space to continue downloading: "
                 "%0.2f %s - %0.2f %s = %0.2f %s",
                 *(
                     transmission_rpc.utils.format_size(
-                        self.client.session.download_dir_free_space,
+                        self.download_dir_free_space,
                     )
                     + transmission_rpc.utils.format_size(
                         self.config["min-free-space"],
                     )
                     + transmission_rpc.utils.format_size(
-                        self.client.session.download_dir_free_space
-                        - self.config["min-free-space"],
+                        self.download_dir_free_space - self.config["min-free-space"],
                     )
                 ),
             )
@@ -305,11 +749,10 @@ class PrunerrDownloadClient:
                     self.config["min-free-space"],
                 )
                 + transmission_rpc.utils.format_size(
-                    self.client.session.download_dir_free_space,
+                    self.download_dir_free_space,
                 )
                 + transmission_rpc.utils.format_size(
-                    self.config["min-free-space"]
-                    - self.client.session.download_dir_free_space,
+                    self.config["min-free-space"] - self.download_dir_free_space,
                 )
             ),
         )
@@ -336,23 +779,23 @@ class PrunerrDownloadClient:
         """
         # TODO: Mark as failed in Servarr?
         seeding_dirs = [servarr.seeding_dir for servarr in self.servarrs.values()]
-        return self.sort_items_by_tracker(
-            item
-            for item in self.items
+        return self.queue_items_by_tracker(
+            record.item
+            for record in self.records
             if (
-                (
-                    item.status == "downloading"
+                record.error == 2
+                and self.UNREGISTERED_ERROR_RE.match(record.errorString.lower())
+                is not None
+                and (
+                    record.status == "downloading"
                     # Give seeding items time to be imported by Servarr since they've
                     # already been fully downloaded.
                     or [
                         seeding_dir
-                        for seeding_dir in seeding_dirs
-                        if seeding_dir in item.path.parents
+                        for seeding_dir in self.get_managed_dirs(record.downloadDir)
+                        if seeding_dir in seeding_dirs
                     ]
                 )
-                and item.error == 2
-                and self.UNREGISTERED_ERROR_RE.match(item.errorString.lower())
-                is not None
             )
         )
 
@@ -360,67 +803,99 @@ class PrunerrDownloadClient:
         """
         Filter items that have not yet been imported by Servarr, order by priority.
         """
-        seeding_dir = (
-            pathlib.Path(self.client.session.download_dir).parent
-            / self.SEEDING_DIR_BASENAME
-        )
-        return self.sort_items_by_tracker(
-            item
-            for item in self.items
-            # only those previously acted on by Servarr and moved
-            if item.status == "seeding"
-            and seeding_dir in item.path.parents
-            and self.operations.exec_indexer_operations(item)[0]
+        return self.queue_items_by_tracker(
+            (
+                record.item
+                # only those previously acted on by Servarr and moved
+                for record in self.dir_records[self.seeding_dir]
+                if record.status == "seeding"
+            ),
+            filtered=True,
         )
 
-    def verify_corrupt_items(self):
+    def get_device(self, download_dir):
         """
-        Verify and resume download items flagged as having corrupt data.
+        Return the filesystem device of the given download directory.
         """
-        corrupt_items = {
-            item.hashString: item
-            for item in self.items
-            if item.hashString not in self.verifying_items
-            and item.error == 3
-            and (
-                "verif" in item.errorString.lower()
-                or "corrput" in item.errorString.lower()
-            )
-        }
-        if corrupt_items:
-            logger.info(
-                "Verifying corrupt download items:\n  %s",
-                "\n  ".join(repr(item) for item in corrupt_items.values()),
-            )
-            self.client.verify_torrent(list(corrupt_items.keys()))
-            self.verifying_items.update(corrupt_items)
-            return list(corrupt_items.keys())
-        return None
+        if download_dir not in self.download_dir_devices:
+            # Directories that don't exist yet will be created on their parent's device
+            resolved_dir = self.resolve_dir(download_dir)
+            while (  # pylint: disable=while-used
+                not resolved_dir.exists() and resolved_dir.parent != resolved_dir
+            ):
+                resolved_dir = resolved_dir.parent
+            self.download_dir_devices[download_dir] = resolved_dir.stat().st_dev
+        return self.download_dir_devices[download_dir]
+
+
+class PrunerrItemQueue:
+    """
+    Download items in descending order of their keys, popped only as needed.
+
+    Each item's key is evaluated once and the items are kept in a heap, so taking the
+    next item in order is `O(log n)` and the rest of the items are never sorted.  Items
+    with equal keys are popped in the order given, the same as a stable reversed sort.
+    Iterating pops items from the queue.
+    """
 
-    def resume_verified_items(self):
+    def __init__(self, items, key):
         """
-        Resume downloading any previously corrupt items that have finished verifying.
+        Evaluate the key of each item and heapify.
         """
-        for verifying_item in self.verifying_items.values():
-            verifying_item.update()
-        verified_items = {
-            item_hash: verifying_item
-            for item_hash, verifying_item in self.verifying_items.items()
-            if not verifying_item.status.startswith("check")
-        }
-        if verified_items:
-            logger.info(
-                "Resuming verified download items:\n  %s",
-                "\n  ".join(repr(item) for item in verified_items.values()),
-            )
-            self.client.start_torrent(list(verified_items.keys()))
-            for item_hash in verified_items.keys():
-                del self.verifying_items[item_hash]
-        return verified_items
+        self.heap = [
+            PrunerrItemQueueEntry(key(item), item_idx, item)
+            for item_idx, item in enumerate(items)
+        ]
+        heapq.heapify(self.heap)
+
+    def __repr__(self):
+        """
+        Readable, informative, and specific representation to ease debugging.
+        """
+        return f"<{type(self).__name__} len={len(self)}>"
+
+    def __len__(self):
+        """
+        Return the number of items left in the queue.
+        """
+        return len(self.heap)
+
+    def __iter__(self):
+        """
+        Pop items in order as they're iterated over.
+        """
+        while self.heap:  # pylint: disable=while-used
+            yield self.pop()
+
+    def pop(self):
+        """
+        Remove and return the item with the greatest key.
+        """
+        return heapq.heappop(self.heap).item
 
 
-class DownloadClientTimeout(Exception):
-    """A download client operation took too long."""
+class PrunerrItemQueueEntry:  # pylint: disable=too-few-public-methods
+    """
+    Order a queued item before others with lesser keys or equal keys given later.
+    """
+
+    __slots__ = ("key", "index", "item")
+
+    def __init__(self, key, index, item):
+        """
+        Capture the item's key and position.
+        """
+        self.key = key
+        self.index = index
+        self.item = item
+
+    def __lt__(self, other):
+        """
+        Invert the key ordering for `heapq` which pops the least entry first.
+        """
+        if self.key == other.key:
+            return self.index < other.index
+        return self.key > other.key
 
 
 def config_from_url(auth_url):
@@ -461,6 +936,21 @@ def calc_free_space_margin(config):
     )
 
 
+def delete_path(path):
+    """
+    Delete the given file or directory and its parent directory if left empty.
+    """
+    # Delete the actual files ourselves to workaround Transmission hanging when
+    # deleting the data of large items: e.g. season packs.
+    if path.is_dir():
+        shutil.rmtree(path, onerror=log_rmtree_error)
+    else:
+        path.unlink()
+    if next(path.parent.iterdir(), None) is None:
+        # The directory containging the file is empty
+        path.parent.rmdir()
+
+
 # TODO: Not sure how to test this, but if there's a way, we should add coverage
 def log_rmtree_error(function, path, excinfo):  # pragma: no cover
     """
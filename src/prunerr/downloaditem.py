@@ -10,7 +10,6 @@ Prunerr interaction with download clients.
 
 import os
 import time
-import urllib.parse
 import json
 import logging
 
@@ -44,20 +43,39 @@ class PrunerrDownloadItem(transmission_rpc.Torrent):
 
     def __init__(self, download_client, client, torrent):
         """
-        Reconstitute the native Python representation.
+        Adopt the native Python representation or parse the raw RPC JSON.
+
+        Given a `transmission_rpc.Torrent` already parsed by the RPC client, share its
+        field storage instead of copying every field value into a new item.  Given the
+        raw JSON mapping from a `torrent-get` response, parse it as the RPC client
+        would.
         """
         self.download_client = download_client
-        super().__init__(
-            client,
-            {field_name: field.value for field_name, field in torrent._fields.items()},
-        )
+        if isinstance(torrent, transmission_rpc.Torrent):
+            # Initialize from only the ID and then share the parsed field storage.
+            # Relies on the `_fields` attribute of `transmission_rpc<4`, as pinned in
+            # `./setup.cfg`, tested with 3.4.
+            super().__init__(client, {"id": torrent.id})
+            self._fields = torrent._fields  # pylint: disable=protected-access
+        else:
+            super().__init__(client, torrent)
 
     def update(self, timeout=None):
         """
         Update cached values when this download item is updated.
         """
         super().update(timeout=timeout)
+        self.forget_paths()
+
+    def forget_paths(self):
+        """
+        Clear cached paths, such as when the item's download directory changes.
+        """
         vars(self).pop("path", None)
+        vars(self).pop("files_parent", None)
+        for item_file in vars(self).get("files", []):
+            vars(item_file).pop("path", None)
+            vars(item_file).pop("stat", None)
 
     @cached_property
     def root_name(self):
@@ -86,9 +104,10 @@ class PrunerrDownloadItem(transmission_rpc.Torrent):
         Return the root path for all files in the download item.
 
         Needed because it's not always the same as the item's download directory plus
-        the item's name.
+        the item's name.  Many items share the same download directory so resolve the
+        directory once for all of them and only join the root name for each item.
         """
-        return (pathlib.Path(self.download_dir) / self.root_name).resolve()
+        return self.download_client.resolve_dir(self.download_dir) / self.root_name
 
     @cached_property
     def files_parent(self):
@@ -97,16 +116,18 @@ class PrunerrDownloadItem(transmission_rpc.Torrent):
 
         This may be the `incomplete_dir` while the item is downloading.
         """
-        files_parent = pathlib.Path(self.download_dir) / self.root_name
+        files_parent = self.path
         if (
             self.download_client.client.session.incomplete_dir_enabled
             and not files_parent.exists()
         ):
             files_parent = (
-                pathlib.Path(self.download_client.client.session.incomplete_dir)
+                self.download_client.resolve_dir(
+                    self.download_client.client.session.incomplete_dir,
+                )
                 / files_parent.name
             )
-        return files_parent.resolve()
+        return files_parent
 
     @cached_property  # noqa: V105
     def age(self):
@@ -197,6 +218,16 @@ class PrunerrDownloadItem(transmission_rpc.Torrent):
             self._fields["sizeWhenDone"].value - self._fields["leftUntilDone"].value
         ) / seconds_downloading
 
+    @cached_property
+    def size_unimported(self):
+        """
+        Estimate the disk space freed by deleting this download item's files.
+
+        Files with more than one hard link, such as those imported by Servarr, don't
+        free any space when deleted.
+        """
+        return self.totalSize - sum(item_file.size_imported for item_file in self.files)
+
     @cached_property
     def files(self):  # pylint: disable=invalid-overridden-method,useless-suppression
         """
@@ -210,28 +241,22 @@ class PrunerrDownloadItem(transmission_rpc.Torrent):
         """
         Return the indexer name if the download item matches a configured tracker URL.
         """
-        for (
-            possible_name,
-            possible_hostnames,
-        ) in self.download_client.operations.config.get(
-            "hostnames",
-            {},
-        ).items():
-            for tracker in self.trackers:
-                for action in ("announce", "scrape"):
-                    tracker_url = urllib.parse.urlsplit(tracker[action])
-                    for indexer_hostname in possible_hostnames:
-                        if tracker_url.hostname == indexer_hostname:
-                            return possible_name
-        return None
+        return self.download_client.operations.match_indexer(self.trackers)
 
-    def review(self, servarr_queue):
+    def review(self, servarr_queue, fingerprints=None, cached_values=None):
         """
         Apply review operations to this download item.
+
+        Removing and changing the item is left to the download client so that removals
+        and changes can be batched across all reviewed items.  Operation values from
+        previous reviews are reused for any operations whose given fingerprints are
+        unchanged.
         """
         _, sort_key = self.download_client.operations.exec_indexer_operations(
             self,
             operations_type="reviews",
+            fingerprints=fingerprints,
+            cached_values=cached_values,
         )
         reviews_indxers = self.download_client.operations.config.get("reviews", [])
         indexer_config = reviews_indxers[sort_key[0]]
@@ -239,7 +264,6 @@ class PrunerrDownloadItem(transmission_rpc.Torrent):
 
         download_id = self.hashString.upper()
         queue_record = servarr_queue.get(download_id, {})
-        queue_id = queue_record.get("id")
 
         results = []
         for operation_config, sort_value in zip(operation_configs, sort_key[1:]):
@@ -260,16 +284,8 @@ class PrunerrDownloadItem(transmission_rpc.Torrent):
                         self,
                         extra={"runner": self.download_client.runner},
                     )
-                else:
-                    delete_params = {}
-                    if operation_config.get("blacklist", False):
-                        delete_params["blacklist"] = "true"
-                        result["blacklist"] = True
-                    queue_record["servarr"].client.delete(
-                        f"queue/{queue_id}",
-                        **delete_params,
-                    )
-                self.download_client.delete_files(self)
+                elif operation_config.get("blacklist", False):
+                    result["blacklist"] = True
                 results.append(result)
                 # Avoid race conditions, perform no further operations on removed items
                 break
@@ -281,12 +297,8 @@ class PrunerrDownloadItem(transmission_rpc.Torrent):
                     self,
                     json.dumps(operation_config["change"]),
                 )
-                self.download_client.client.change_torrent(
-                    [self.hashString],
-                    **operation_config["change"],
-                )
+                self.download_client.queue_change(self, operation_config["change"])
                 results.append(operation_config["change"])
-                self.update()
 
         return results
 
@@ -336,3 +348,76 @@ class PrunerrDownloadItemFile:
         if self.stat is not None and self.st_nlink > 1:
             return self.st_size
         return 0
+
+
+def field_value(field_name):
+    """
+    Return a property that reads the raw value of the given download item field.
+    """
+
+    def get_field_value(self):
+        return self.torrent._fields[  # pylint: disable=protected-access
+            field_name
+        ].value
+
+    get_field_value.__name__ = field_name
+    get_field_value.__doc__ = f"Return the raw `{field_name}` item field value."
+    return property(get_field_value)
+
+
+class PrunerrDownloadItemRecord:
+    """
+    Lightweight view of a download item for filtering the whole list of items.
+
+    Only the fields needed to select items for an action are exposed.  The full
+    ``PrunerrDownloadItem``, with all its cached file and path state, is materialized
+    only when an item has been selected and an RPC action or rich operation needs it.
+    Both share the same RPC client field storage, so updates to one are reflected in the
+    other.
+    """
+
+    __slots__ = ("download_client", "torrent", "_item")
+
+    def __init__(self, download_client, torrent):
+        """
+        Capture references to the download client and the parsed RPC client item.
+        """
+        self.download_client = download_client
+        self.torrent = torrent
+        self._item = None
+
+    def __repr__(self):
+        """
+        Readable, informative, and specific representation to ease debugging.
+        """
+        return f"<{type(self).__name__} {self.hashString!r}>"
+
+    id = field_value("id")
+    hashString = field_value("hashString")
+    error = field_value("error")
+    errorString = field_value("errorString")
+    downloadDir = field_value("downloadDir")
+    leftUntilDone = field_value("leftUntilDone")
+    sizeWhenDone = field_value("sizeWhenDone")
+    totalSize = field_value("totalSize")
+    trackers = field_value("trackers")
+
+    @property
+    def status(self):
+        """
+        Return the download item status name as the RPC client library does.
+        """
+        return self.torrent.status
+
+    @property
+    def item(self):
+        """
+        Materialize the full download item only as needed and only once.
+        """
+        if self._item is None:
+            self._item = PrunerrDownloadItem(
+                self.download_client,
+                self.torrent._client,  # pylint: disable=protected-access
+                self.torrent,
+            )
+        return self._item
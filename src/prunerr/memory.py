@@ -0,0 +1,245 @@
+# SPDX-FileCopyrightText: 2023 Ross Patterson <me@rpatterson.net>
+# SPDX-License-Identifier: MIT
+
+# pylint: disable=magic-value-comparison,missing-any-param-doc,missing-param-doc
+# pylint: disable=missing-return-doc,missing-return-type-doc,missing-type-doc
+# pylint: disable=missing-yield-doc,missing-yield-type-doc,missing-raises-doc
+
+"""
+Trace the memory Prunerr uses in each loop to find leaks and enforce a budget.
+"""
+
+import os
+import sys
+import tracemalloc
+import contextlib
+import logging
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    # Not available on Windows
+    resource = None  # type: ignore[assignment]
+
+import transmission_rpc
+
+logger = logging.getLogger(__name__)
+
+# Attribute allocations to the most recent frame in the Prunerr package
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+# `ru_maxrss` is in kilobytes on Linux and bytes on macOS
+MAXRSS_SCALE = 1 if sys.platform == "darwin" else 1024
+# Linux reports and resets the peak resident size, `VmHWM`, in these files:
+# https://www.kernel.org/doc/html/latest/filesystems/proc.html
+PROC_STATUS = "/proc/self/status"
+PROC_CLEAR_REFS = "/proc/self/clear_refs"
+
+
+class PrunerrMemoryBudgetError(Exception):
+    """
+    Prunerr used more memory than the configured budget.
+    """
+
+
+class PrunerrMemory:
+    """
+    Trace memory allocations with `tracemalloc` when enabled by `daemon/memory/trace`.
+
+    At the end of each loop, after freeing the memory possible, report the memory still
+    allocated grouped by the Prunerr module that allocated it and the change since the
+    previous loop.  For each phase of the order of operations, record the peak memory
+    allocated and the peak resident size of the process during the phase.  The peak
+    resident size can only be reset for each phase on Linux, elsewhere it's the peak of
+    the process so far.  If the memory still allocated exceeds `daemon/memory/budget`,
+    either log an error or raise an exception to exit as configured by
+    `daemon/memory/budget-action`.
+    """
+
+    def __init__(self, runner):
+        """
+        Capture a reference to the runner and initialize the per-phase peaks.
+        """
+        self.runner = runner
+        self.config = {}
+        self.phases = {}
+        # The peaks so far of the phases that enclose the current phase
+        self.enclosing_peaks = []
+        # The peak resident size of the process before the last reset
+        self.resident_peak = 0
+        self.previous_modules = {}
+
+    def __repr__(self):
+        """
+        Readable, informative, and specific representation to ease debugging.
+        """
+        return f"<{type(self).__name__} trace={self.config.get('trace')!r}>"
+
+    def update(self, config):
+        """
+        Update configuration and start tracing if enabled.
+        """
+        self.config = config
+        if self.config["trace"] and not tracemalloc.is_tracing():
+            # Enough frames to find the Prunerr code behind library allocations
+            tracemalloc.start(self.config["frames"])
+        elif not self.config["trace"] and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def phase(self, phase):
+        """
+        Record the peak memory allocated and resident size during the phase.
+        """
+        if not tracemalloc.is_tracing():
+            yield
+            return
+        # Resetting the peaks for this phase would lose the enclosing phases' peaks
+        peaks = get_peaks()
+        self.enclosing_peaks = [
+            (max(traced_peak, peaks[0]), max(resident_peak, peaks[1]))
+            for traced_peak, resident_peak in self.enclosing_peaks
+        ]
+        self.enclosing_peaks.append((0, 0))
+        self.resident_peak = max(self.resident_peak, peaks[1])
+        tracemalloc.reset_peak()
+        reset_resident_peak()
+        try:
+            yield
+        finally:
+            peaks = get_peaks()
+            enclosing_peaks = self.enclosing_peaks.pop()
+            traced_peak = max(enclosing_peaks[0], peaks[0])
+            self.phases[phase] = {
+                "traced-peak": traced_peak,
+                "resident-peak": max(enclosing_peaks[1], peaks[1]),
+            }
+            self.runner.metrics.set(
+                "prunerr_phase_memory_peak_bytes",
+                traced_peak,
+                phase=phase,
+            )
+
+    def check(self):
+        """
+        Report the memory still allocated at the end of a loop and enforce the budget.
+
+        :return: Map Prunerr modules to the bytes still allocated by them
+        """
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = tracemalloc.take_snapshot()
+        modules = group_by_module(snapshot)
+        current = sum(modules.values())
+        logger.info(
+            "Memory still allocated after the loop: %0.2f %s, peak resident: %0.2f %s",
+            *(
+                transmission_rpc.utils.format_size(current)
+                + transmission_rpc.utils.format_size(
+                    max(self.resident_peak, get_resident_peak()),
+                )
+            ),
+        )
+        for module, size in sorted(
+            modules.items(),
+            key=lambda module_item: module_item[1],
+            reverse=True,
+        )[: self.config["top"]]:
+            logger.info(
+                "Memory allocated by %s: %0.2f %s (%+d bytes since the previous loop)",
+                module,
+                *transmission_rpc.utils.format_size(size),
+                size - self.previous_modules.get(module, size),
+            )
+        for phase, phase_memory in self.phases.items():
+            logger.debug(
+                "Memory peak during %s: %0.2f %s, peak resident: %0.2f %s",
+                phase,
+                *(
+                    transmission_rpc.utils.format_size(phase_memory["traced-peak"])
+                    + transmission_rpc.utils.format_size(phase_memory["resident-peak"])
+                ),
+            )
+        self.previous_modules = modules
+
+        if self.config["budget"] and current > self.config["budget"]:
+            message = (
+                f"Memory still allocated after the loop exceeds the budget: "
+                f"{current} > {self.config['budget']}"
+            )
+            if self.config["budget-action"] == "exit":
+                raise PrunerrMemoryBudgetError(message)
+            logger.error(message)
+        return modules
+
+
+def group_by_module(snapshot):
+    """
+    Sum the sizes of the traced allocations by the Prunerr module that allocated them.
+
+    Allocations in libraries are attributed to the most recent Prunerr frame that
+    called them.  Allocations without any Prunerr frame are grouped as `other`.
+    """
+    modules = {}
+    for trace in snapshot.traces:
+        module = "other"
+        for frame in reversed(trace.traceback):
+            if frame.filename.startswith(PACKAGE_DIR):
+                module = get_module_name(frame.filename)
+                break
+        modules[module] = modules.get(module, 0) + trace.size
+    return modules
+
+
+def get_module_name(filename):
+    """
+    Return the dotted name of the Prunerr module in the given file.
+    """
+    relative = os.path.relpath(os.path.splitext(filename)[0], PACKAGE_DIR)
+    return ".".join(["prunerr"] + relative.split(os.sep))
+
+
+def get_peaks():
+    """
+    Return the peak memory allocated and resident size since they were last reset.
+    """
+    _, traced_peak = tracemalloc.get_traced_memory()
+    return traced_peak, get_resident_peak()
+
+
+def get_resident_peak():
+    """
+    Return the peak resident size in bytes since last reset, if supported.
+
+    Falls back to the peak resident size of the process, zero if not supported.
+    """
+    try:  # pylint: disable=too-many-try-statements
+        with open(PROC_STATUS, encoding="utf-8") as status_opened:
+            for line in status_opened:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:  # pragma: no cover
+        pass
+    return get_max_rss()  # pragma: no cover
+
+
+def reset_resident_peak():
+    """
+    Reset the peak resident size to the current resident size, if supported.
+
+    :return: Whether the peak resident size was reset
+    """
+    try:  # pylint: disable=too-many-try-statements
+        with open(PROC_CLEAR_REFS, "w", encoding="utf-8") as clear_refs_opened:
+            clear_refs_opened.write("5")
+    except OSError:  # pragma: no cover
+        return False
+    return True
+
+
+def get_max_rss():
+    """
+    Return the peak resident size of the process in bytes, zero if not supported.
+    """
+    if resource is None:  # pragma: no cover
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_SCALE
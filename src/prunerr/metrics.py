@@ -0,0 +1,370 @@
+# SPDX-FileCopyrightText: 2023 Ross Patterson <me@rpatterson.net>
+# SPDX-License-Identifier: MIT
+
+# pylint: disable=magic-value-comparison,missing-any-param-doc,missing-param-doc
+# pylint: disable=missing-return-doc,missing-return-type-doc,missing-type-doc
+# pylint: disable=missing-yield-doc,missing-yield-type-doc
+
+"""
+Collect metrics about the daemon loop and serve them in the Prometheus text format.
+"""
+
+import time
+import threading
+import dataclasses
+import contextlib
+import http.server
+import logging
+
+import prunerr.tracing
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class PrunerrMetric:
+    """
+    The Prometheus type and help text of a metric.
+    """
+
+    type: str
+    help: str
+
+
+# Map metric names to their Prometheus type and help text
+METRICS = {
+    "prunerr_phase_duration_seconds": PrunerrMetric(
+        "summary",
+        "Seconds spent in each phase of the order of operations.",
+    ),
+    "prunerr_phase_last_duration_seconds": PrunerrMetric(
+        "gauge",
+        "Seconds spent in the most recent run of each phase.",
+    ),
+    "prunerr_phase_memory_peak_bytes": PrunerrMetric(
+        "gauge",
+        "Peak memory allocated during the most recent run of each phase when tracing.",
+    ),
+    "prunerr_rpc_requests_total": PrunerrMetric(
+        "counter",
+        "Requests sent to download client and Servarr APIs per endpoint.",
+    ),
+    "prunerr_rpc_duration_seconds": PrunerrMetric(
+        "histogram",
+        "Seconds waiting for responses from download client and Servarr APIs.",
+    ),
+    "prunerr_rpc_retries_total": PrunerrMetric(
+        "counter",
+        "Requests to download client and Servarr APIs sent again, e.g. for a new "
+        "Transmission session ID.",
+    ),
+    "prunerr_rpc_response_bytes_total": PrunerrMetric(
+        "counter",
+        "Bytes received in responses from download client and Servarr APIs.",
+    ),
+    "prunerr_items": PrunerrMetric(
+        "gauge",
+        "Download items in each download client per status.",
+    ),
+    "prunerr_freed_bytes_total": PrunerrMetric(
+        "counter",
+        "Estimated bytes freed by deleting download items and orphaned files.",
+    ),
+    "prunerr_deletions_total": PrunerrMetric(
+        "counter",
+        "Download items and orphaned files deleted.",
+    ),
+    "prunerr_free_space_bytes": PrunerrMetric(
+        "gauge",
+        "Free space on the filesystem of each download client directory.",
+    ),
+}
+# The upper bounds of the histogram buckets for API response times in seconds
+RPC_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Map the RPC metrics to their keys in the `--stats` output
+RPC_STATS = {
+    "prunerr_rpc_requests_total": "calls",
+    "prunerr_rpc_retries_total": "retries",
+    "prunerr_rpc_response_bytes_total": "response-bytes",
+    "prunerr_rpc_duration_seconds": "seconds",
+}
+
+
+class PrunerrRPCResponses:  # pylint: disable=too-few-public-methods
+    """
+    Count the HTTP responses and bytes received through a `requests` session.
+
+    Used to record the retries and response sizes of API calls whose client libraries
+    only return the parsed responses.
+    """
+
+    def __init__(self, session):
+        """
+        Register to be called for each response the session receives.
+        """
+        self.count = 0
+        self.size = 0
+        session.hooks["response"].append(self.record)
+
+    def record(self, response, *args, **kwargs):  # pylint: disable=unused-argument
+        """
+        Count the response and the size of its body.
+        """
+        self.count += 1
+        self.size += len(response.content)
+
+
+class PrunerrMetrics:
+    """
+    Collect metrics in memory and serve them over HTTP when configured.
+
+    Metrics are always collected as it costs little.  The `daemon` sub-command serves
+    them for Prometheus to scrape when `daemon/metrics/port` is configured.
+    """
+
+    server = None
+
+    def __init__(self):
+        """
+        Initialize the empty samples.
+        """
+        self.config = {}
+        self.lock = threading.Lock()
+        # Map metric names to sorted label items to values
+        self.samples = {}
+
+    def __repr__(self):
+        """
+        Readable, informative, and specific representation to ease debugging.
+        """
+        return f"<{type(self).__name__} port={self.config.get('port')!r}>"
+
+    def update(self, config):
+        """
+        Update configuration and start serving the metrics if configured.
+        """
+        self.config = config
+        if self.config.get("port") is not None and self.server is None:
+            self.server = http.server.ThreadingHTTPServer(
+                (self.config["address"], self.config["port"]),
+                PrunerrMetricsHandler,
+            )
+            self.server.metrics = self
+            threading.Thread(
+                target=self.server.serve_forever,
+                name="prunerr-metrics",
+                daemon=True,
+            ).start()
+            logger.info(
+                "Serving Prometheus metrics at http://%s:%s/metrics",
+                *self.server.server_address[:2],
+            )
+        return self.server
+
+    def shutdown(self):
+        """
+        Stop serving the metrics.
+        """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def inc(self, name, value=1, **labels):
+        """
+        Add to the counter with the given labels.
+        """
+        label_items = tuple(sorted(labels.items()))
+        with self.lock:
+            metric_samples = self.samples.setdefault(name, {})
+            metric_samples[label_items] = metric_samples.get(label_items, 0) + value
+
+    def set(self, name, value, **labels):
+        """
+        Set the gauge with the given labels.
+        """
+        with self.lock:
+            self.samples.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def clear(self, name, **labels):
+        """
+        Drop the samples that have all the given labels, e.g. for gone statuses.
+        """
+        with self.lock:
+            metric_samples = self.samples.get(name, {})
+            for label_items in list(metric_samples):
+                if set(labels.items()) <= set(label_items):
+                    del metric_samples[label_items]
+
+    def observe(self, name, value, **labels):
+        """
+        Add an observation to the summary or histogram with the given labels.
+        """
+        label_items = tuple(sorted(labels.items()))
+        with self.lock:
+            metric_samples = self.samples.setdefault(name, {})
+            if (sample := metric_samples.get(label_items)) is None:
+                sample = metric_samples[label_items] = {"count": 0, "sum": 0}
+                if METRICS[name].type == "histogram":
+                    sample["buckets"] = [0] * len(RPC_DURATION_BUCKETS)
+            sample["count"] += 1
+            sample["sum"] += value
+            if "buckets" in sample:
+                for bucket_idx, bucket_bound in enumerate(RPC_DURATION_BUCKETS):
+                    if value <= bucket_bound:
+                        sample["buckets"][bucket_idx] += 1
+
+    @contextlib.contextmanager
+    def timed(self, name, **labels):
+        """
+        Observe the seconds spent in the body in the summary with the given labels.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @contextlib.contextmanager
+    def phase(self, phase):
+        """
+        Record the duration of a phase of the order of operations.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.observe("prunerr_phase_duration_seconds", duration, phase=phase)
+            self.set("prunerr_phase_last_duration_seconds", duration, phase=phase)
+
+    @contextlib.contextmanager
+    def rpc(self, service, endpoint, responses=None):
+        """
+        Count a call to a download client or Servarr API and time the response.
+
+        If given the responses of the API client's session, also count any requests
+        sent again and the bytes received.
+        """
+        labels = {"service": service, "endpoint": endpoint}
+        self.inc("prunerr_rpc_requests_total", **labels)
+        if responses is not None:
+            count, size = responses.count, responses.size
+        try:  # pylint: disable=too-many-try-statements
+            with prunerr.tracing.span("rpc", **labels), self.timed(
+                "prunerr_rpc_duration_seconds",
+                **labels,
+            ):
+                yield
+        finally:
+            if responses is not None:
+                self.inc(
+                    "prunerr_rpc_retries_total",
+                    max(responses.count - count - 1, 0),
+                    **labels,
+                )
+                self.inc(
+                    "prunerr_rpc_response_bytes_total",
+                    responses.size - size,
+                    **labels,
+                )
+
+    def rpc_stats(self):
+        """
+        Return the API calls per service and endpoint for the `--stats` output.
+        """
+        stats = {}
+        with self.lock:
+            for name, stat_key in RPC_STATS.items():
+                for label_items, value in self.samples.get(name, {}).items():
+                    labels = dict(label_items)
+                    endpoint_stats = stats.setdefault(labels["service"], {}).setdefault(
+                        labels["endpoint"],
+                        {},
+                    )
+                    if isinstance(value, dict):
+                        endpoint_stats[stat_key] = value["sum"]
+                        endpoint_stats["histogram"] = dict(
+                            zip(
+                                (str(bound) for bound in RPC_DURATION_BUCKETS),
+                                value["buckets"],
+                            ),
+                            **{"+Inf": value["count"]},
+                        )
+                    else:
+                        endpoint_stats[stat_key] = value
+        return stats
+
+    def render(self):
+        """
+        Return all the samples in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            for name, metric_samples in self.samples.items():
+                metric = METRICS[name]
+                metric_type = metric.type
+                lines.append(f"# HELP {name} {metric.help}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for label_items, value in sorted(metric_samples.items()):
+                    labels = format_labels(label_items)
+                    if metric_type == "histogram":
+                        for bucket_bound, bucket_count in zip(
+                            RPC_DURATION_BUCKETS + ("+Inf",),
+                            value["buckets"] + [value["count"]],
+                        ):
+                            bucket_labels = format_labels(
+                                label_items + (("le", bucket_bound),),
+                            )
+                            lines.append(f"{name}_bucket{bucket_labels} {bucket_count}")
+                    if metric_type in {"summary", "histogram"}:
+                        lines.append(f"{name}_count{labels} {value['count']}")
+                        lines.append(f"{name}_sum{labels} {value['sum']!r}")
+                    else:
+                        lines.append(f"{name}{labels} {value!r}")
+        return "".join(f"{line}\n" for line in lines)
+
+
+class PrunerrMetricsHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Respond to Prometheus scrapes with the current metrics.
+    """
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Send the metrics in the Prometheus text exposition format.
+        """
+        if self.path.split("?", 1)[0] not in {"/", "/metrics"}:
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """
+        Log requests at the debug level instead of writing to stderr.
+        """
+        logger.debug(format, *args)
+
+
+def format_labels(label_items):
+    """
+    Return the labels of a sample in the Prometheus text exposition format.
+    """
+    if not label_items:
+        return ""
+    labels = ",".join(
+        f'{label}="{escape_label_value(value)}"' for label, value in label_items
+    )
+    return f"{{{labels}}}"
+
+
+def escape_label_value(value):
+    """
+    Escape a label value as required by the Prometheus text exposition format.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
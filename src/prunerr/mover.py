@@ -0,0 +1,344 @@
+# SPDX-FileCopyrightText: 2023 Ross Patterson <me@rpatterson.net>
+# SPDX-License-Identifier: MIT
+
+# pylint: disable=missing-any-param-doc,missing-param-doc,missing-return-doc
+# pylint: disable=missing-return-type-doc,missing-type-doc
+
+"""
+Track download items a download client is moving until they finish moving.
+"""
+
+import time
+import logging
+
+import transmission_rpc
+
+from .utils import pathlib
+
+logger = logging.getLogger(__name__)
+
+
+class PrunerrMover:
+    """
+    Request moves from a download client and track the items until they've moved.
+
+    Moves within the same filesystem are requested at once.  Moves across filesystems
+    are queued in chunks that are requested one at a time.  Moving items are tracked
+    across updates so that the rest of the order of operations can proceed while they
+    move.
+    """
+
+    # Only the fields needed to confirm moved items, in a consistent order
+    MOVE_FIELDS = [
+        "id",
+        "hashString",
+        "downloadDir",
+        "status",
+        "error",
+        "errorString",
+    ]
+    # Bounds on the seconds between checking moving items
+    MOVE_WAIT_MIN = 0.1
+    MOVE_WAIT_MAX = 10
+
+    def __init__(self, download_client):
+        """
+        Capture a reference to the download client and initialize the tracked moves.
+        """
+        self.download_client = download_client
+        self.moving_items = {}
+        self.move_chunks = []
+        self.moving_chunk = None
+
+    def __repr__(self):
+        """
+        Readable, informative, and specific representation to ease debugging.
+        """
+        return f"<{type(self).__name__} moving={len(self.moving_items)!r}>"
+
+    def request_moves(self, items, destination):
+        """
+        Request the download client to move the download items to the destination.
+
+        Moves within the same filesystem are only renames, so request them all at once.
+        Moves across filesystems copy all the data, so queue them in chunks up to a
+        maximum total size and only request the next chunk when the previous chunk has
+        finished moving.
+        """
+        destination = pathlib.Path(destination)
+        destination_device = self.download_client.get_device(destination)
+        renamed_items = []
+        copied_items = []
+        for item in items:
+            if self.download_client.get_device(item.downloadDir) == destination_device:
+                renamed_items.append(item)
+            else:
+                copied_items.append(item)
+        if renamed_items:
+            self.start_moves(renamed_items, destination)
+        if copied_items:
+            move_chunks = [[]]
+            move_chunk_size = 0
+            for item in copied_items:
+                if (
+                    move_chunks[-1]
+                    and move_chunk_size + item.totalSize
+                    > self.download_client.config["max-move-chunk-size"]
+                ):
+                    move_chunks.append([])
+                    move_chunk_size = 0
+                move_chunks[-1].append(item)
+                move_chunk_size += item.totalSize
+            self.move_chunks.extend(
+                (move_chunk, destination) for move_chunk in move_chunks
+            )
+            logger.info(
+                "Queued download items to move across filesystems in %s chunks: %r",
+                len(move_chunks),
+                str(destination),
+            )
+            self.start_move_chunk()
+        return items
+
+    def start_moves(self, items, destination):
+        """
+        Request the download client to move the items and track them until moved.
+        """
+        self.download_client.client.move_torrent_data(
+            ids=[item.hashString for item in items],
+            location=destination,
+        )
+        for item in items:
+            self.moving_items[item.hashString] = (item, destination)
+        return items
+
+    def start_move_chunk(self):
+        """
+        Request the next queued chunk of moves across filesystems if none are moving.
+        """
+        if self.moving_chunk is not None or not self.move_chunks:
+            return None
+        items, destination = self.move_chunks.pop(0)
+        self.moving_chunk = {
+            "hashes": {item.hashString for item in items},
+            "size": sum(item.totalSize for item in items),
+            "start": time.time(),
+        }
+        logger.info(
+            "Moving chunk of download items across filesystems, %0.2f %s: %r\n  %s",
+            *transmission_rpc.utils.format_size(self.moving_chunk["size"]),
+            str(destination),
+            "\n  ".join(repr(item) for item in items),
+        )
+        return self.start_moves(items, destination)
+
+    def finish_move_chunk(self):
+        """
+        Report progress when the moving chunk has finished and start the next chunk.
+        """
+        if self.moving_chunk is None or (
+            self.moving_chunk["hashes"] & self.moving_items.keys()
+        ):
+            return None
+        seconds = time.time() - self.moving_chunk["start"]
+        logger.info(
+            "Moved chunk of download items across filesystems, "
+            "%0.2f %s in %0.1fs at %0.2f %s, %s chunks remaining",
+            *(
+                transmission_rpc.utils.format_size(self.moving_chunk["size"])
+                + (seconds,)
+                + transmission_rpc.utils.format_speed(
+                    self.moving_chunk["size"] / seconds if seconds else 0,
+                )
+                + (len(self.move_chunks),)
+            ),
+        )
+        self.moving_chunk = None
+        return self.start_move_chunk()
+
+    def is_moving(self, item_hash):
+        """
+        Return whether the item is moving or queued to move.
+        """
+        return item_hash in self.moving_items or any(
+            item.hashString == item_hash
+            for move_chunk, _ in self.move_chunks
+            for item in move_chunk
+        )
+
+    def check_moves(self):
+        """
+        Update and return any moving download items that have finished moving.
+
+        The download client updates an item's download directory only after it has
+        moved all the item's files, after which the item's original path no longer
+        exists.  So only treat an item as moved once its original path is gone.  Request
+        the fields needed for all tracked items in one request so that moves the
+        download client has failed are also noticed and no longer tracked, which allows
+        moving them again later.
+        """
+        if not self.moving_items:
+            return []
+        moving_torrents = {
+            torrent.hashString: torrent
+            for torrent in self.download_client.client._request(  # pylint: disable=protected-access
+                "torrent-get",
+                {"fields": self.MOVE_FIELDS},
+                list(self.moving_items.keys()),
+            ).values()
+        }
+        moved_items = []
+        changed_dirs = set()
+        for item_hash, (item, destination) in list(self.moving_items.items()):
+            if item_hash not in moving_torrents:
+                logger.warning(
+                    "Moving download item removed from download client: %r",
+                    item,
+                )
+                del self.moving_items[item_hash]
+                continue
+            if self.is_move_failed(item, destination, moving_torrents[item_hash]):
+                logger.error(
+                    "Download client failed to move download item, %r: %r",
+                    moving_torrents[item_hash].error_string,
+                    item,
+                )
+                del self.moving_items[item_hash]
+                continue
+            if (
+                item.path.exists()
+                or pathlib.Path(moving_torrents[item_hash].download_dir).resolve()
+                != destination.resolve()
+            ):
+                continue
+            changed_dirs.update((item.downloadDir, destination))
+            item._update_fields(  # pylint: disable=protected-access
+                moving_torrents[item_hash],
+            )
+            del self.moving_items[item_hash]
+            moved_items.append(item)
+        if moved_items:
+            # Update the download item's dir for subsequent operations
+            self.download_client.forget_resolved_dirs(*changed_dirs)
+            for item in moved_items:
+                item.forget_paths()
+            self.download_client.index_records()
+        # A failed or removed item may also have been the last of the moving chunk
+        self.finish_move_chunk()
+        return moved_items
+
+    def is_move_failed(self, item, destination, torrent):
+        """
+        Return whether the download client has given up moving the item.
+
+        The download client reports an error for a move that fails.  An item that is
+        stopped with neither its download directory changed nor any of its files copied
+        to the destination also isn't moving.
+        """
+        if torrent.error:
+            return True
+        return (
+            torrent.status.stopped
+            and pathlib.Path(torrent.download_dir).resolve()
+            == pathlib.Path(item.downloadDir).resolve()
+            and not (
+                self.download_client.resolve_dir(destination) / item.root_name
+            ).exists()
+        )
+
+    def reconcile_moves(self):
+        """
+        Update tracked moves from a new list of download items.
+
+        Stop tracking items that have finished moving or have been removed and replace
+        the others with their current download items.
+        """
+        records = {record.hashString: record for record in self.download_client.records}
+        for item_hash, (_, destination) in list(self.moving_items.items()):
+            record = records.get(item_hash)
+            if (
+                record is None
+                or pathlib.Path(record.downloadDir).resolve() == destination.resolve()
+            ):
+                del self.moving_items[item_hash]
+            else:
+                self.moving_items[item_hash] = (record.item, destination)
+        move_chunks = []
+        for move_chunk, destination in self.move_chunks:
+            if chunk_items := [
+                records[item.hashString].item
+                for item in move_chunk
+                if item.hashString in records
+                and pathlib.Path(records[item.hashString].downloadDir).resolve()
+                != destination.resolve()
+            ]:
+                move_chunks.append((chunk_items, destination))
+        self.move_chunks = move_chunks
+        # The moving chunk may have finished or been removed
+        self.finish_move_chunk()
+        return self.moving_items
+
+    def get_moving_items(self, devices=None):
+        """
+        Return the moving items, optionally only those moving to or from the devices.
+        """
+        if devices is None:
+            return self.moving_items
+        return {
+            item_hash: (item, destination)
+            for item_hash, (item, destination) in self.moving_items.items()
+            if self.download_client.get_device(item.downloadDir) in devices
+            or self.download_client.get_device(destination) in devices
+        }
+
+    def get_moving_paths(self):
+        """
+        Return the paths to which the moving items' files are being moved.
+
+        Moves across filesystems copy the files to the destination before the download
+        client updates the item's download directory, so until the move finishes the
+        copied files don't belong to any item.
+        """
+        return {
+            self.download_client.resolve_dir(destination) / item.root_name
+            for item, destination in self.moving_items.values()
+        }
+
+    def wait_moves(self, move_timeout=5 * 60, devices=None):
+        """
+        Wait for moving download items to finish moving, backing off between checks.
+
+        Optionally wait only for the items already moving to or from the given
+        filesystem devices, not for queued chunks that start moving in the meantime.
+        Otherwise also wait for all queued chunks.  Stop waiting if no item finishes
+        moving within the timeout, the moves are still tracked in later updates.
+        """
+        moved_items = []
+        waiting = set(self.get_moving_items(devices))
+        deadline = time.time() + move_timeout
+        move_wait = self.MOVE_WAIT_MIN
+        while waiting:  # pylint: disable=while-used
+            if checked_items := self.check_moves():
+                moved_items.extend(checked_items)
+                # Large moves across filesystems take a long time in total, only time
+                # out if they stop making progress, such as between chunks.
+                deadline = time.time() + move_timeout
+                move_wait = self.MOVE_WAIT_MIN
+            elif time.time() > deadline:
+                logger.warning(
+                    "Timed out waiting for %s items to finish moving:\n  %s",
+                    self.download_client.config["name"],
+                    "\n  ".join(
+                        repr(self.moving_items[item_hash][0]) for item_hash in waiting
+                    ),
+                )
+                break
+            else:
+                time.sleep(move_wait)
+                move_wait = min(move_wait * 2, self.MOVE_WAIT_MAX)
+            waiting = (
+                set(self.moving_items)
+                if devices is None
+                else waiting & self.moving_items.keys()
+            )
+        return moved_items
@@ -3,7 +3,7 @@
 
 # pylint: disable=missing-any-param-doc,magic-value-comparison,missing-raises-doc
 # pylint: disable=missing-return-doc,missing-return-type-doc,missing-param-doc
-# pylint: disable=missing-type-doc
+# pylint: disable=missing-type-doc,missing-yield-doc,missing-yield-type-doc
 
 """
 Download item metadata operations used in Prunerr configuration.
@@ -12,12 +12,54 @@ Used to determine item indexer priority, reviewing grabbed items, etc.
 """
 
 import re
+import time
+import json
+import functools
+import contextlib
+import urllib.parse
 import logging
 
 logger = logging.getLogger(__name__)
 
 missing_value = object()
 
+# Pseudo field name for values that may change over time without any change to the
+# download item's fields, e.g. the time since the item was added or `stat()` results
+TIME_DEPENDENT_FIELD = "time-dependent"
+# Download item attributes derived from fields other than the `camelCase` form
+DERIVED_FIELD_NAMES = {
+    "ratio": frozenset({"uploadRatio"}),
+    "age": frozenset({"addedDate", TIME_DEPENDENT_FIELD}),
+    "seconds_since_done": frozenset(
+        {
+            "leftUntilDone",
+            "percentDone",
+            "doneDate",
+            "startDate",
+            "addedDate",
+            TIME_DEPENDENT_FIELD,
+        },
+    ),
+    "seconds_downloading": frozenset(
+        {"doneDate", "addedDate", TIME_DEPENDENT_FIELD},
+    ),
+    "rate_total": frozenset(
+        {
+            "sizeWhenDone",
+            "leftUntilDone",
+            "doneDate",
+            "addedDate",
+            TIME_DEPENDENT_FIELD,
+        },
+    ),
+}
+# Download item fields from which the RPC client library assembles item files
+FILES_FIELD_NAMES = frozenset({"files", "priorities", "wanted"})
+# Item file attributes taken from the download client, others come from `stat()`
+FILE_RPC_NAMES = frozenset({"name", "size", "completed", "priority", "selected"})
+# Reusable context manager for when profiling operations isn't enabled
+NOT_PROFILED = contextlib.nullcontext()
+
 
 def apply_sort_value(operation_config, include, sort_value):
     """
@@ -56,7 +98,131 @@ def apply_sort_value(operation_config, include, sort_value):
     return include, sort_value
 
 
-class PrunerrOperations:
+class PrunerrOperationsProfile:
+    """
+    Record the cost of operations, reuse of cached results, and why items were ordered.
+
+    Enabled by the `--profile-operations` CLI option to find which operations slow down
+    a run and to explain which operation decided each download item's inclusion or
+    order.
+    """
+
+    def __init__(self):
+        """
+        Initialize the empty statistics and explanations.
+        """
+        self.operations = {}
+        self.caches = {}
+        self.items = {}
+        # The list to which the explanations of the current operations are appended
+        self.nodes = None
+
+    @contextlib.contextmanager
+    def timed(self, name):
+        """
+        Count the call and add the time spent in the body to the named statistics.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats = self.operations.setdefault(name, {"calls": 0, "seconds": 0.0})
+            stats["calls"] += 1
+            stats["seconds"] += time.perf_counter() - start
+
+    @contextlib.contextmanager
+    def operation(self, operation_config):
+        """
+        Time the operation and yield its explanation for the caller to fill in.
+
+        The explanations of any nested operations are added to this one's.
+        """
+        node = {"type": operation_config["type"]}
+        if "name" in operation_config:
+            node["name"] = operation_config["name"]
+        if (parent_nodes := self.nodes) is not None:
+            parent_nodes.append(node)
+        self.nodes = node["operations"] = []
+        with self.timed(operation_config["type"]):
+            try:
+                yield node
+            finally:
+                self.nodes = parent_nodes
+                if not node["operations"]:
+                    del node["operations"]
+
+    @contextlib.contextmanager
+    def explain(self, item, operations_type, indexer_name):
+        """
+        Collect the explanations of the item's operations and yield them.
+        """
+        item_explained = self.items.setdefault(
+            item.hashString,
+            {"name": item.name},
+        )
+        explained = item_explained[operations_type] = {
+            "indexer": indexer_name,
+            "operations": [],
+        }
+        parent_nodes = self.nodes
+        self.nodes = explained["operations"]
+        try:
+            yield explained
+        finally:
+            self.nodes = parent_nodes
+
+    def count_cache(self, name, hit):
+        """
+        Count a lookup in the named cache.
+        """
+        stats = self.caches.setdefault(name, {"hits": 0, "misses": 0})
+        stats["hits" if hit else "misses"] += 1
+
+    def explain_order(self, items, get_key, operations_type="priorities"):
+        """
+        Mark the operation that ordered each item before the next item.
+
+        The first element of the sort key is the indexer position, the rest are the
+        values of the indexer's operations.  Items whose keys are equal to the next
+        item's are ordered as given and explained as ties.
+        """
+        for item, next_item in zip(items, items[1:]):
+            if (
+                explained := self.items.get(item.hashString, {}).get(operations_type)
+            ) is None:
+                continue
+            explained["ordered-by"] = "tie"
+            for key_idx, (sort_value, next_value) in enumerate(
+                zip(get_key(item), get_key(next_item)),
+            ):
+                if sort_value != next_value:
+                    if key_idx:
+                        explained["ordered-by"] = key_idx - 1
+                        decided = explained["operations"][key_idx - 1].setdefault(
+                            "decided",
+                            [],
+                        )
+                        if "order" not in decided:
+                            decided.append("order")
+                    else:
+                        explained["ordered-by"] = "indexer"
+                    break
+
+    def as_json(self):
+        """
+        Return the statistics and explanations as JSON serializable data.
+        """
+        return {
+            "operations": self.operations,
+            "caches": {
+                name: dict(stats, **{"hit-rate": stats["hits"] / sum(stats.values())})
+                for name, stats in self.caches.items()
+            },
+            "items": self.items,
+        }
+
+
+class PrunerrOperations:  # pylint: disable=too-many-instance-attributes
     """
     Download item metadata operations used in Prunerr configuration.
 
@@ -83,53 +249,265 @@ class PrunerrOperations:
             for operations_type, indexer_configs in config.items()
             if operations_type != "hostnames"
         }
+        # Map each operations type and indexer directly to its position and config
+        self.indexer_positions = {
+            operations_type: {
+                indexer_name: (indexer_idx, indexer_config)
+                for indexer_idx, (indexer_name, indexer_config) in enumerate(
+                    indexer_configs.items(),
+                )
+            }
+            for operations_type, indexer_configs in self.indexer_operations.items()
+        }
+        # Map each tracker hostname to the position and name of the first indexer that
+        # lists it
+        self.indexer_hostnames = {}
+        for indexer_idx, (indexer_name, indexer_hostnames) in enumerate(
+            config.get("hostnames", {}).items(),
+        ):
+            for indexer_hostname in indexer_hostnames:
+                self.indexer_hostnames.setdefault(
+                    indexer_hostname,
+                    (indexer_idx, indexer_name),
+                )
 
         self.seen_empty_files = set()
+        self.operation_fields = {}
+        # Only profile when enabled by the `--profile-operations` CLI option
+        self.profile = download_client.operations_profile
 
-    def exec_indexer_operations(self, item, operations_type="priorities"):
+    def match_indexer(self, trackers):
+        """
+        Return the indexer name if any of the trackers match a configured hostname.
+
+        If the trackers match more than one indexer, return the first configured.
+        """
+        matched = None
+        for tracker in trackers:
+            for action in ("announce", "scrape"):
+                if (
+                    indexer := self.indexer_hostnames.get(
+                        get_url_hostname(tracker[action]),
+                    )
+                ) is not None and (matched is None or indexer < matched):
+                    matched = indexer
+        return None if matched is None else matched[1]
+
+    def get_indexer_config(self, trackers, operations_type="priorities"):
+        """
+        Return the index and configuration of the indexer that matches the trackers.
+        """
+        indexer_positions = self.indexer_positions.get(operations_type, {})
+        if (indexer_name := self.match_indexer(trackers)) not in indexer_positions:
+            indexer_name = None
+        return indexer_positions[indexer_name]
+
+    def exec_indexer_operations(
+        self,
+        item,
+        operations_type="priorities",
+        fingerprints=None,
+        cached_values=None,
+    ):
         """
         Run indexer operations for the download item and return results.
         """
         cached_results = vars(item).setdefault("prunerr_operations_results", {})
+        if self.profile is not None:
+            self.profile.count_cache("item", operations_type in cached_results)
         if operations_type in cached_results:
             return cached_results[operations_type]
 
-        indexer_configs = self.indexer_operations.get(operations_type, {})
-        if (indexer_name := item.match_indexer_urls()) not in indexer_configs:
-            indexer_name = None
-        indexer_idx = list(indexer_configs.keys()).index(indexer_name)
-        indexer_config = indexer_configs[indexer_name]
+        with (
+            self.profile.timed("match-indexer")
+            if self.profile is not None
+            else NOT_PROFILED
+        ):
+            indexer_idx, indexer_config = self.get_indexer_config(
+                item.trackers,
+                operations_type,
+            )
+        # Reuse the results from previous daemon loops if the fields read are unchanged
+        memo_fingerprint = None
+        if fingerprints is None and (
+            memo_seconds := self.download_client.config.get("operations-memo-seconds")
+        ):
+            memo_fingerprint = fingerprint_fields(
+                [indexer_idx, indexer_config],
+                item._fields,  # pylint: disable=protected-access
+                self.get_indexer_fields(indexer_config),
+                int(time.time() // memo_seconds),
+            )
+            memo = self.download_client.operations_memo.get(
+                (item.hashString, operations_type),
+            )
+            memo_hit = (
+                memo_fingerprint is not None and memo and memo[0] == memo_fingerprint
+            )
+            if self.profile is not None:
+                self.profile.count_cache("memo", memo_hit)
+            if memo_hit:
+                cached_results[operations_type] = memo[1]
+                return cached_results[operations_type]
 
-        include, sort_key = self.exec_operations(indexer_config["operations"], item)
+        with (
+            self.profile.explain(item, operations_type, indexer_config["name"])
+            if self.profile is not None
+            else NOT_PROFILED
+        ) as explained:
+            include, sort_key = self.exec_operations(
+                indexer_config["operations"],
+                item,
+                fingerprints,
+                cached_values,
+            )
+        if explained is not None:
+            explained["include"] = include
         cached_results[operations_type] = (include, (indexer_idx,) + sort_key)
+        if memo_fingerprint is not None:
+            self.download_client.operations_memo[(item.hashString, operations_type)] = (
+                memo_fingerprint,
+                cached_results[operations_type],
+            )
         return cached_results[operations_type]
 
-    def exec_operations(self, operation_configs, item):
+    def exec_operations(
+        self,
+        operation_configs,
+        item,
+        fingerprints=None,
+        cached_values=None,
+    ):
         """
         Execute each of the configured indexer priority operations.
+
+        If given fingerprints of the fields each operation reads, reuse the values in
+        `cached_values` from operations whose fingerprint is unchanged and record the
+        values of those that are re-evaluated.
         """
         # TODO: Add `name` to operation configs and use in log/exc messages
         sort_key = []
         include = True
-        for operation_config in operation_configs:
+        for operation_idx, operation_config in enumerate(operation_configs):
             executor = getattr(self, f"exec_operation_{operation_config['type']}", None)
             if executor is None:
                 raise NotImplementedError(
                     f"No indexer priority operation executor found for type "
                     f"{operation_config['type']!r}"
                 )
-            # Delegate to the executor to get the operation value for this download item
-            if (sort_value := executor(operation_config, item)) is None:
+            fingerprint = fingerprints[operation_idx] if fingerprints else None
+            with (
+                self.profile.operation(operation_config)
+                if self.profile is not None
+                else NOT_PROFILED
+            ) as explained:
+                cache_hit = (
+                    fingerprint is not None
+                    and cached_values.get(operation_idx, (None, None))[0] == fingerprint
+                )
+                if self.profile is not None and fingerprint is not None:
+                    self.profile.count_cache("review", cache_hit)
+                if cache_hit:
+                    sort_value = cached_values[operation_idx][1]
+                else:
+                    # Delegate to the executor to get the operation value for this item
+                    sort_value = executor(operation_config, item)
+                    if fingerprint is not None:
+                        cached_values[operation_idx] = (fingerprint, sort_value)
+            if explained is not None:
+                explained["value"] = explain_value(sort_value)
+            if sort_value is None:
                 # If an executor returns None, all other handling should be skipped
                 return include, tuple(sort_key)
+            included = include
             include, sort_value = apply_sort_value(
                 operation_config,
                 include,
                 sort_value,
             )
+            if explained is not None:
+                explained["sort-value"] = explain_value(sort_value)
+                if included and not include:
+                    explained.setdefault("decided", []).append("include")
             sort_key.append(sort_value)
         return include, tuple(sort_key)
 
+    def get_operation_fields(self, operation_config):
+        """
+        Return the download item fields an operation reads, derived from its config.
+
+        Include `TIME_DEPENDENT_FIELD` if the operation's value may change without any
+        change to the download item's fields, such as the time since the item was added
+        or the `stat()` of its files.  Return `None` if the fields it reads can't be
+        determined.
+        """
+        # Key on the configuration itself, the configuration may be changed or reloaded
+        config_key = (
+            "operation",
+            json.dumps(operation_config, sort_keys=True, default=str),
+        )
+        if config_key in self.operation_fields:
+            return self.operation_fields[config_key]
+
+        field_names = None
+        if operation_config["type"] == "value":
+            field_names = get_field_names(operation_config["name"])
+        elif operation_config["type"] == "files":
+            field_names = get_files_field_names(operation_config)
+        elif operation_config["type"] in {"or", "and"}:
+            field_names = frozenset()
+            for nested_config in operation_config["operations"]:
+                if (nested_names := self.get_operation_fields(nested_config)) is None:
+                    field_names = None
+                    break
+                field_names |= nested_names
+
+        self.operation_fields[config_key] = field_names
+        return field_names
+
+    def get_indexer_fields(self, indexer_config):
+        """
+        Return the download item fields all of an indexer's operations read.
+        """
+        config_key = (
+            "indexer",
+            json.dumps(indexer_config, sort_keys=True, default=str),
+        )
+        if config_key in self.operation_fields:
+            return self.operation_fields[config_key]
+        field_names = frozenset()
+        for operation_config in indexer_config["operations"]:
+            if (operation_names := self.get_operation_fields(operation_config)) is None:
+                field_names = None
+                break
+            field_names |= operation_names
+        self.operation_fields[config_key] = field_names
+        return field_names
+
+    def fingerprint_indexer_operations(
+        self,
+        record,
+        operations_type="reviews",
+        queue_id=None,
+    ):
+        """
+        Fingerprint the fields read by each of the item's indexer's operations.
+
+        The fingerprint is `None` for operations that must always be re-evaluated,
+        including time dependent operations.  Also cover the item's Servarr queue record
+        ID, if any, since whether and how an item is removed depends on it.
+        """
+        fields = record.torrent._fields  # pylint: disable=protected-access
+        _, indexer_config = self.get_indexer_config(record.trackers, operations_type)
+        return [
+            fingerprint_fields(
+                [operation_config, queue_id],
+                fields,
+                self.get_operation_fields(operation_config),
+            )
+            for operation_config in indexer_config["operations"]
+        ]
+
     def exec_operation_value(  # noqa: V105, pylint: disable=no-self-use
         self,
         operation_config,
@@ -189,13 +567,12 @@ class PrunerrOperations:
             return False
 
         if patterns := operation_config.get("patterns", []):
-            matching_files = []
-            for pattern in patterns:
-                matching_files.extend(
-                    item_file
-                    for item_file in download_item.files
-                    if re.fullmatch(pattern, item_file.name)
-                )
+            patterns = tuple(patterns)
+            matching_files = [
+                item_file
+                for item_file in download_item.files
+                if match_file_name(patterns, item_file.name)
+            ]
         else:
             matching_files = download_item.files
 
@@ -211,3 +588,116 @@ class PrunerrOperations:
             raise ValueError(f"Unknown item files aggregation {aggregation!r}")
 
         return sort_value
+
+
+def explain_value(value):
+    """
+    Return a JSON serializable representation of an operation value.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (tuple, list)):
+        return [explain_value(nested_value) for nested_value in value]
+    return repr(value)
+
+
+@functools.lru_cache(maxsize=2**10)
+def get_url_hostname(url):
+    """
+    Return the hostname of the URL, tracker URLs are shared by many download items.
+    """
+    return urllib.parse.urlsplit(url).hostname
+
+
+@functools.lru_cache(maxsize=None)
+def compile_patterns(patterns):
+    """
+    Compile the patterns into as few regular expressions as match the same names.
+
+    Combine the patterns into one alternation only when that can't change what they
+    match.  Inline global flags, e.g. `(?i)`, must start the whole expression and
+    numbered backreferences would refer to the groups of the preceding patterns, so
+    keep any patterns with flags or groups as separate expressions.
+    """
+    compiled = tuple(re.compile(pattern) for pattern in patterns)
+    default_flags = re.compile("").flags
+    if len(compiled) > 1 and all(
+        pattern.flags == default_flags and not pattern.groups for pattern in compiled
+    ):
+        try:
+            return (re.compile("|".join(f"(?:{pattern})" for pattern in patterns)),)
+        except re.error:  # pragma: no cover
+            pass
+    return compiled
+
+
+@functools.lru_cache(maxsize=2**16)
+def match_file_name(patterns, file_name):
+    """
+    Return whether the whole file name matches any of the patterns.
+
+    Item file names never change, so cache the result for each file name and patterns.
+    """
+    return any(
+        pattern.fullmatch(file_name) is not None
+        for pattern in compile_patterns(patterns)
+    )
+
+
+def get_field_names(name):
+    """
+    Return the download item fields read by an attribute.
+
+    Item attributes from the RPC client library use the `snake_case` form of the
+    `camelCase` field names.  Other derived attributes don't correspond to any field and
+    are treated as unknown when fingerprinting.
+    """
+    if name in DERIVED_FIELD_NAMES:
+        return DERIVED_FIELD_NAMES[name]
+    return frozenset(
+        {re.sub("_([a-z])", lambda match: match.group(1).upper(), name)},
+    )
+
+
+def get_files_field_names(operation_config):
+    """
+    Return the download item fields a `files` operation reads, derived from its config.
+    """
+    field_names = FILES_FIELD_NAMES
+    if (
+        operation_config.get("aggregation", "portion") != "count"
+        and operation_config.get("name", "size") not in FILE_RPC_NAMES
+    ):
+        # The item's files' `stat()` may change at any time
+        field_names |= {"downloadDir", "name", TIME_DEPENDENT_FIELD}
+    if operation_config.get("aggregation", "portion") == "portion":
+        field_names |= get_field_names(
+            operation_config.get("total", "size_when_done"),
+        )
+    return field_names
+
+
+def fingerprint_fields(operation_config, fields, field_names, time_bucket=None):
+    """
+    Fingerprint an operation's configuration and the values of the fields it reads.
+
+    Covering the configuration invalidates the values from before any change to the
+    configuration.  Time dependent values are fingerprinted by the given period of time,
+    if any, so that they're re-evaluated when that period is over.  Return `None` if
+    the values must always be re-evaluated.
+    """
+    if field_names is None:
+        return None
+    values = []
+    for field_name in sorted(field_names):
+        if field_name == TIME_DEPENDENT_FIELD:
+            if time_bucket is None:
+                return None
+            values.append(time_bucket)
+        elif field_name not in fields:
+            return None
+        else:
+            values.append(fields[field_name].value)
+    return hash(
+        json.dumps([operation_config, values], sort_keys=True, default=str),
+    )
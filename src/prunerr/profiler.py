@@ -0,0 +1,95 @@
+# SPDX-FileCopyrightText: 2023 Ross Patterson <me@rpatterson.net>
+# SPDX-License-Identifier: MIT
+
+# pylint: disable=missing-any-param-doc,missing-param-doc,missing-return-doc
+# pylint: disable=missing-return-type-doc,missing-type-doc
+
+"""
+Profile slow loops of the order of operations to reproduce them offline.
+"""
+
+import time
+import cProfile
+import logging
+
+from .utils import pathlib
+
+logger = logging.getLogger(__name__)
+
+
+class PrunerrProfiler:
+    """
+    Profile each loop with `cProfile` and keep the statistics of the slow loops.
+
+    Enabled by the `--profile DIR` option of the `daemon` and `exec` sub-commands.  The
+    statistics of loops that take longer than `daemon/profile/min-duration` are written
+    to `*.pstats` files in the directory named by loop number and duration, for example
+    to load with `python -m pstats`.  Only the most recent `daemon/profile/keep` files
+    are kept, all of them if zero.
+    """
+
+    directory = None
+
+    def __init__(self, runner):
+        """
+        Capture a reference to the runner and start counting loops.
+        """
+        self.runner = runner
+        self.config = {}
+        self.loop_count = 0
+
+    def __repr__(self):
+        """
+        Readable, informative, and specific representation to ease debugging.
+        """
+        return f"<{type(self).__name__} directory={self.directory!r}>"
+
+    def update(self, config):
+        """
+        Update configuration.
+        """
+        self.config = config
+
+    def run(self, loop_func, *args, **kwargs):
+        """
+        Call the loop, profiling it if enabled, and return its results.
+        """
+        if self.directory is None:
+            return loop_func(*args, **kwargs)
+        self.loop_count += 1
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            return profile.runcall(loop_func, *args, **kwargs)
+        finally:
+            if (duration := time.perf_counter() - start) >= self.config["min-duration"]:
+                self.dump(profile, duration)
+            else:
+                logger.debug(
+                    "Not keeping profile of loop %s faster than %ss: %0.3fs",
+                    self.loop_count,
+                    self.config["min-duration"],
+                    duration,
+                )
+
+    def dump(self, profile, duration):
+        """
+        Write the loop's statistics and delete the oldest beyond the number to keep.
+        """
+        directory = pathlib.Path(self.directory).expanduser()
+        directory.mkdir(parents=True, exist_ok=True)
+        # Loop numbers restart with the process, prefix the time to keep names unique
+        stats_path = directory / (
+            f"prunerr-{time.strftime('%Y%m%dT%H%M%S')}"
+            f"-loop-{self.loop_count:06d}-{duration:0.3f}s.pstats"
+        )
+        profile.dump_stats(stats_path)
+        logger.info("Wrote profile of loop %s: %s", self.loop_count, stats_path)
+        if self.config["keep"]:
+            # The names sort in the order the loops ran
+            for old_path in sorted(directory.glob("prunerr-*-loop-*.pstats"))[
+                : -self.config["keep"]
+            ]:
+                logger.debug("Deleting old loop profile: %s", old_path)
+                old_path.unlink()
+        return stats_path
@@ -6,6 +6,8 @@ Run Prunerr commands across multiple Servarr instances and download clients.
 """
 
 import gc
+import collections.abc
+import contextlib
 import os
 import time
 import pathlib
@@ -18,13 +20,18 @@ import transmission_rpc
 
 import prunerr.downloadclient
 import prunerr.servarr
+import prunerr.deleter
+import prunerr.metrics
+import prunerr.profiler
+import prunerr.memory
+import prunerr.tracing
 from . import utils
 from .utils import cached_property
 
 logger = logging.getLogger(__name__)
 
 
-class PrunerrRunner:
+class PrunerrRunner:  # pylint: disable=too-many-instance-attributes
     """
     Run Prunerr sub-commands across multiple Servarr instances and download clients.
     """
@@ -33,6 +40,7 @@ class PrunerrRunner:
 
     config: dict
     quiet = False
+    profile_operations = False
 
     def __init__(self, config):
         """
@@ -43,6 +51,11 @@ class PrunerrRunner:
         # Initialize any local instance state
         self.download_clients = {}
         self.servarrs = {}
+        self.deleter = prunerr.deleter.PrunerrDeleter(self)
+        self.metrics = prunerr.metrics.PrunerrMetrics()
+        self.profiler = prunerr.profiler.PrunerrProfiler(self)
+        self.memory = prunerr.memory.PrunerrMemory(self)
+        self.tracer = prunerr.tracing.PrunerrTracer()
 
     def validate(self) -> dict:
         """
@@ -80,6 +93,28 @@ class PrunerrRunner:
             "poll",
             self.example_confg["daemon"]["poll"],
         )
+        metrics_config = self.config["daemon"].setdefault("metrics", {})
+        for metrics_key, metrics_default in self.example_confg["daemon"][
+            "metrics"
+        ].items():
+            metrics_config.setdefault(metrics_key, metrics_default)
+        profile_config = self.config["daemon"].setdefault("profile", {})
+        for profile_key, profile_default in self.example_confg["daemon"][
+            "profile"
+        ].items():
+            profile_config.setdefault(profile_key, profile_default)
+        memory_config = self.config["daemon"].setdefault("memory", {})
+        for memory_key, memory_default in self.example_confg["daemon"][
+            "memory"
+        ].items():
+            memory_config.setdefault(memory_key, memory_default)
+        self.config["daemon"].setdefault("trace", {}).setdefault(
+            "path",
+            self.example_confg["daemon"]["trace"]["path"],
+        )
+        deletion_config = self.config.setdefault("deletion", {})
+        for deletion_key, deletion_default in self.example_confg["deletion"].items():
+            deletion_config.setdefault(deletion_key, deletion_default)
 
         return self.config
 
@@ -99,6 +134,11 @@ class PrunerrRunner:
             ``prunerr.downloadclient.PrunerrDownloadClient`` instances
         """
         self.config = self.validate()
+        # Start deleting in the background before refreshing free space
+        self.deleter.update(self.config["deletion"])
+        self.profiler.update(self.config["daemon"]["profile"])
+        self.memory.update(self.config["daemon"]["memory"])
+        self.tracer.update(self.config["daemon"]["trace"])
 
         # Update Servarr API clients
         servarrs = {}
@@ -130,7 +170,9 @@ class PrunerrRunner:
                     "servarrs",
                     set(),
                 ).add(servarr.config["url"])
-        # Update the download clients, instantiating if newly defined
+        # Update the download clients, instantiating if newly defined.  Only background
+        # deletions completed before now are reflected in the refreshed sessions.
+        completed = self.deleter.get_completed()
         download_clients = {}
         for (
             download_client_url,
@@ -153,6 +195,7 @@ class PrunerrRunner:
                 ].download_client = download_clients[download_client_url]
             download_clients[download_client_url].update(download_client_config)
         self.download_clients = download_clients
+        self.deleter.forget_completed(completed)
 
         return self.download_clients
 
@@ -179,7 +222,8 @@ class PrunerrRunner:
 
         # Start verifying corrupt torrents as early as possible to give them as much
         # time to finish as possible.
-        self.verify()
+        with self.phase("verify"):
+            self.verify()
 
         # Run `review` before `move` so it can make any changes to download items before
         # they're moved and excluded from future review.
@@ -187,15 +231,21 @@ class PrunerrRunner:
         if "reviews" in self.config.get(  # pylint: disable=magic-value-comparison
             "indexers", {}
         ):
-            if (review_results := self.review()) is not None:
+            with self.phase("review"):
+                review_results = self.review()
+            if review_results is not None:
                 results["review"] = review_results
 
         # Run `move` before `free-spacce` so that all download items that could be
         # eligible for deletion are in the `seeding` directory.
-        if move_results := self.move():
+        with self.phase("move"):
+            move_results = self.move()
+        if move_results:
             results["move"] = move_results
 
-        if free_space_results := self.free_space():
+        with self.phase("free-space"):
+            free_space_results = self.free_space()
+        if free_space_results:
             results["free-space"] = free_space_results
 
         if results:
@@ -210,7 +260,7 @@ class PrunerrRunner:
         """
         verify_results = {}
         for download_client_url, download_client in self.download_clients.items():
-            if verifying_items := download_client.verify_corrupt_items():
+            if verifying_items := download_client.verifier.verify_corrupt_items():
                 verify_results[download_client_url] = verifying_items
         return verify_results
 
@@ -218,6 +268,9 @@ class PrunerrRunner:
         """
         Move download items that have been acted on by Servarr into the seeding dir.
 
+        Only request the moves, don't wait for them to finish.  Phases that depend on
+        the moved items wait for the moves on the filesystems they use.
+
         :return: Map download client URLs to moved download items
         """
         move_results: dict = {}
@@ -275,6 +328,17 @@ class PrunerrRunner:
 
         if not (download_clients := self.free_space_download_clients()):
             return None
+        # Moves on the same filesystems change which items and files can be deleted
+        if self.wait_moves(
+            {
+                download_client.get_device(download_client.client.session.download_dir)
+                for download_client in download_clients.values()
+            },
+        ):
+            # Moves across filesystems also change free space
+            next(iter(download_clients.values())).refresh_sessions()
+            if not (download_clients := self.free_space_download_clients()):
+                return None
 
         results: dict = {}
 
@@ -297,16 +361,17 @@ class PrunerrRunner:
         logger.info(
             "Deleting orphaned files not belonging to any download item to free space",
         )
-        for orphan_download_clients, file_path, file_stat in self.find_orphans():
-            first_download_client = next(iter(orphan_download_clients.values()))
-            first_download_client.delete_files((file_path, file_stat))
-            results.setdefault(
-                first_download_client.config["url"],
-                [],
-            ).append(str(file_path))
-            # Do any download clients still need to free space?
-            if not (download_clients := self.free_space_download_clients()):
-                return results
+        with self.phase("orphans"):
+            for orphan_download_clients, file_path, file_stat in self.find_orphans():
+                first_download_client = next(iter(orphan_download_clients.values()))
+                first_download_client.delete_files((file_path, file_stat))
+                results.setdefault(
+                    first_download_client.config["url"],
+                    [],
+                ).append(str(file_path))
+                # Do any download clients still need to free space?
+                if not (download_clients := self.free_space_download_clients()):
+                    return results
 
         logger.info(
             "Deleting seeding download items to free space",
@@ -321,7 +386,7 @@ class PrunerrRunner:
                 download_client_url,
                 *transmission_rpc.utils.format_size(
                     download_client.config["min-free-space"]
-                    - download_client.client.session.download_dir_free_space,
+                    - download_client.download_dir_free_space,
                 ),
             )
             kwargs = {"speed_limit_down": 0, "speed_limit_down_enabled": True}
@@ -344,12 +409,17 @@ class PrunerrRunner:
             start = time.time()
 
             try:  # pylint: disable=too-many-try-statements
-                # Refresh the list of download items
-                self.update()
-                # Resume any corrupt download items that have finished verifying
-                self.resume_verified_items()
-                # Run the `exec` sub-command as the inner loop
-                self.exec_()
+                # Trace each loop once configured, if enabled
+                with self.tracer.trace("loop"):
+                    # Refresh the list of download items
+                    with self.phase("update"):
+                        self.update()
+                    # Serve the metrics once configured, if enabled
+                    self.metrics.update(self.config["daemon"]["metrics"])
+                    # Resume any corrupt download items that have finished verifying
+                    self.resume_verified_items()
+                    # Run the `exec` sub-command as the inner loop
+                    self.profiler.run(self.exec_)
             except utils.RETRY_EXC_TYPES as exc:  # pragma: no cover
                 logger.error(
                     "Connection error while updating from server: %s",
@@ -366,6 +436,8 @@ class PrunerrRunner:
 
             # Free any memory possible between daemon loops
             self.clear()
+            # Report any memory still allocated, including leaks
+            self.memory.check()
 
             # Wait for the next interval
             if (time_left := poll - (time.time() - start)) > 0:
@@ -374,6 +446,21 @@ class PrunerrRunner:
 
     # Other methods
 
+    @contextlib.contextmanager
+    def phase(  # pylint: disable=missing-yield-doc
+        self,
+        phase: str,
+    ) -> collections.abc.Iterator:
+        """
+        Record the duration and memory use of a phase of the order of operations.
+
+        :param phase: The name of the phase in metrics and reports
+        :yield: Nothing, run the phase in the body
+        """
+        with prunerr.tracing.span(phase), self.metrics.phase(phase):
+            with self.memory.phase(phase):
+                yield
+
     def free_space_download_clients(self) -> dict:
         """
         Return all download clients that don't have sufficient free space.
@@ -398,8 +485,8 @@ class PrunerrRunner:
         Delete download items until sufficient space is free the items are exhausted.
 
         If there are items to delete, then after deleting each item, refresh the
-        download clients free space and lists of download items and repeat until either
-        there are no more download items to delete or all download clients have
+        download clients free space and continue with the next items in order until
+        either there are no more download items to delete or all download clients have
         sufficient free space.
 
         :param download_clients: The download clients from which to delete download
@@ -412,26 +499,76 @@ class PrunerrRunner:
             ``prunerr.downloadclient.PrunerrDownloadClient`` instances that still have
             insufficient free space
         """
+        # Find and order the candidate items once per download client and only take the
+        # next item from the front of the queue for each deletion.  The space freed by
+        # deleting an item is only an estimate so check the free space again after each.
+        download_client_queues: dict = {}
         while download_clients:  # pylint: disable=while-used
             for download_client_url, download_client in download_clients.items():
-                removed_size = None
-                for download_item in getattr(
-                    download_client,
-                    download_client_method,
-                )():
-                    removed_size = download_client.delete_files(download_item)
-                    results.setdefault(
-                        download_client_url,
-                        [],
-                    ).append(download_item.hashString)
+                if download_client_url not in download_client_queues:
+                    download_client_queues[download_client_url] = getattr(
+                        download_client,
+                        download_client_method,
+                    )()
+                if (
+                    download_item := next(
+                        iter(download_client_queues[download_client_url]),
+                        None,
+                    )
+                ) is not None:
+                    results.setdefault(download_client_url, []).extend(
+                        download_client.delete_items([download_item]),
+                    )
                     download_clients = self.free_space_download_clients()
                     break
-                if removed_size:
-                    break
             else:
                 break
         return download_clients
 
+    def wait_moves(self, devices: typing.Optional[set] = None) -> list:
+        """
+        Wait for moving download items to finish across all download clients.
+
+        :param devices: Only wait for items moving to or from these filesystem devices
+        :return: The download items that finished moving
+        """
+        moved_items = []
+        for download_client in self.download_clients.values():
+            moved_items.extend(download_client.mover.wait_moves(devices=devices))
+        return moved_items
+
+    def get_item_files(self) -> set:
+        """
+        Collect all the download item files that actually exist currently.
+
+        :return: The paths of the files of all download items in all download clients
+        """
+        item_files: set = set()
+        for download_client in self.download_clients.values():
+            for download_item in download_client.items:
+                item_files.update(
+                    item_file.path
+                    for item_file in download_item.files
+                    if item_file.path.exists()
+                )
+        return item_files
+
+    def get_skipped_paths(self) -> set:
+        """
+        Collect the paths under which files aren't orphans even if not item files.
+
+        Files still being copied by moves across filesystems aren't orphans, including
+        moves by download clients that don't need space or moves that timed out.
+        Neither are the files of removed items still being deleted in the background.
+
+        :return: The paths of moving download items and pending deletions
+        """
+        skipped_paths: set = self.deleter.get_pending_paths()
+        for download_client in self.download_clients.values():
+            skipped_paths.update(download_client.mover.get_moving_paths())
+        return skipped_paths
+
+    @prunerr.tracing.traced
     def find_orphans(self) -> list:
         """
         Find paths in download client directories that don't correspond to an item.
@@ -445,15 +582,8 @@ class PrunerrRunner:
 
         :return: A list of orphaned filesystem paths
         """
-        # Collect all the download item files that actually exist currently
-        item_files: set = set()
-        for download_client_url, download_client in self.download_clients.items():
-            for download_item in download_client.items:
-                item_files.update(
-                    item_file.path
-                    for item_file in download_item.files
-                    if item_file.path.exists()
-                )
+        item_files = self.get_item_files()
+        skipped_paths = self.get_skipped_paths()
 
         # Aggregate all the download item directories across all download clients.  Some
         # download item directories may be shared across download clients and some may
@@ -478,10 +608,14 @@ class PrunerrRunner:
         # such syscalls downstream.
         orphans = []
         for download_item_dir, download_clients in download_item_dirs.items():
-            for dirpath, _, filenames in os.walk(download_item_dir):
-                for filename in filenames:
-                    file_path = download_item_dir / dirpath / filename
-                    if file_path not in item_files:
+            with prunerr.tracing.span("walk", path=download_item_dir):
+                for dirpath, _, filenames in os.walk(download_item_dir):
+                    for filename in filenames:
+                        file_path = download_item_dir / dirpath / filename
+                        if file_path in item_files or skipped_paths.intersection(
+                            (file_path, *file_path.parents),
+                        ):
+                            continue
                         orphans.append(
                             (download_clients, file_path, file_path.stat()),
                         )
@@ -497,18 +631,22 @@ class PrunerrRunner:
         """
         Resume downloading any previously corrupt items that have finished verifying.
 
-        Optionally wait until all verifying items have finished and resume them all.
+        Optionally wait until all verifying items, including those queued to verify,
+        have finished and resume them all.
 
         :param wait: Whether to block until verifying items finish
         :return: Map download client URLs to resumed download items
         """
         resume_results = {}
         for download_client_url, download_client in self.download_clients.items():
-            resumed_items = list(download_client.resume_verified_items().values())
+            verifier = download_client.verifier
+            resumed_items = list(verifier.resume_verified_items().values())
             if wait:
-                while download_client.verifying_items:  # pylint: disable=while-used
-                    time.sleep(1)
-                    resumed_items.extend(download_client.resume_verified_items())
+                while verifier.verifying_items:  # pylint: disable=while-used
+                    time.sleep(verifier.verify_wait())
+                    resumed_items.extend(verifier.resume_verified_items())
+                    # Start verifying queued corrupt items as earlier ones finish
+                    verifier.verify_corrupt_items()
             if resumed_items:
                 resume_results[download_client_url] = resumed_items
         return resume_results
@@ -525,6 +663,8 @@ class PrunerrRunner:
             del download_client.operations
             del download_client.client
             download_client.servarrs.clear()
-            del download_client.items
+            download_client.records = None
+            download_client.dir_records.clear()
+            vars(download_client).pop("items", None)
         # Tell Python it's a good time to free memory
         gc.collect()
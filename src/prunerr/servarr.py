@@ -9,16 +9,19 @@
 Prunerr interaction with Servarr instances.
 """
 
+import typing
 import dataclasses
-import time
+import functools
 import urllib.parse
 import logging
 
+import requests
 import arrapi
 import arrapi.apis.base
 
-import prunerr.downloadclient
 import prunerr.downloaditem
+import prunerr.metrics
+import prunerr.tracing
 from . import utils
 from .utils import pathlib
 
@@ -32,20 +35,46 @@ class PrunerrServarrAPIClient:
     """
 
     client: arrapi.apis.base.BaseAPI
+    metrics: typing.Optional[prunerr.metrics.PrunerrMetrics] = None
+    responses: typing.Optional[prunerr.metrics.PrunerrRPCResponses] = None
 
     @property
     def get(self):
         """
         Return the `arrapi` client private/internal `GET` method.
         """
-        return self.client._raw._get  # pylint: disable=protected-access
+        return self.record_rpc(
+            "GET",
+            self.client._raw._get,  # pylint: disable=protected-access
+        )
 
     @property
     def delete(self):
         """
         Return the `arrapi` client private/internal `DELETE` method.
         """
-        return self.client._raw._delete  # pylint: disable=protected-access
+        return self.record_rpc(
+            "DELETE",
+            self.client._raw._delete,  # pylint: disable=protected-access
+        )
+
+    def record_rpc(self, http_method, method):
+        """
+        Wrap the API method to count and time requests by endpoint, if collecting.
+        """
+        if self.metrics is None:
+            return method
+
+        @functools.wraps(method)
+        def recorded_method(path, *args, **kwargs):
+            with self.metrics.rpc(
+                "servarr",
+                f"{http_method} {path}",
+                self.responses,
+            ):
+                return method(path, *args, **kwargs)
+
+        return recorded_method
 
 
 class PrunerrServarrInstance:
@@ -99,6 +128,7 @@ class PrunerrServarrInstance:
         """
         return f"<{type(self).__name__} {self.config.get('name')!r}>"
 
+    @prunerr.tracing.traced
     def update(self, config):
         """
         Update configuration, connect the API client, and refresh Servarr API data.
@@ -113,11 +143,16 @@ class PrunerrServarrInstance:
             "Connecting to %s",
             self.config["name"],
         )
+        # Measure the responses to API calls that only return the parsed responses
+        session = requests.Session()
         self.client = PrunerrServarrAPIClient(
             self.TYPE_MAPS[self.config["type"]]["client"](
                 self.config["url"],
                 self.config["api-key"],
+                session=session,
             ),
+            self.runner.metrics,
+            prunerr.metrics.PrunerrRPCResponses(session),
         )
 
         download_clients = {}
@@ -151,6 +186,26 @@ class PrunerrServarrInstance:
 
         return self.client
 
+    def delete_queue_records(self, queue_ids, blocklist=False):
+        """
+        Remove the given records from the Servarr queue in one request.
+
+        Optionally also add the releases to the blocklist so they're not grabbed again.
+        """
+        logger.debug(
+            "Deleting %s queue records: %r",
+            self.config["name"],
+            queue_ids,
+        )
+        delete_params = {}
+        if blocklist:
+            delete_params["blocklist"] = "true"
+        return self.client.delete(
+            "queue/bulk",
+            json={"ids": list(queue_ids)},
+            **delete_params,
+        )
+
     def get_api_paged_records(self, endpoint, page_number=1, **params):
         """
         Yield each page of the given paged endpoint until exhausted.
@@ -172,13 +227,14 @@ class PrunerrServarrInstance:
                 page_number,
                 params,
             )
-            response = self.client.get(
-                endpoint,
-                # Maximum Servarr page size
-                pageSize=self.MAX_PAGE_SIZE,
-                page=page_number,
-                **params,
-            )
+            with prunerr.tracing.span("page", endpoint=endpoint, page=page_number):
+                response = self.client.get(
+                    endpoint,
+                    # Maximum Servarr page size
+                    pageSize=self.MAX_PAGE_SIZE,
+                    page=page_number,
+                    **params,
+                )
             page_number = response["page"] + 1
             yield from response["records"]
 
@@ -223,7 +279,7 @@ class PrunerrServarrDownloadClient:
         ).resolve()
         return self.download_dir
 
-    def move(self, move_timeout=5 * 60):
+    def move(self):
         """
         Move download items that have been acted on by Servarr into the seeding dir.
 
@@ -232,23 +288,27 @@ class PrunerrServarrDownloadClient:
         include items that have some Servarr history events other than `grabbed` to
         prevent moving manually grabbed items out from under Servarr before it's had a
         chance to recognize notice them.
+
+        Only request the download client to move the items, the download client tracks
+        them until they've finished moving.
         """
         download_items = [
-            download_item
-            for download_item in self.download_client.items
-            # Skip items still downloading
-            if download_item.status == "seeding"
-            # Skip items known by a Servarr instance in it's queue
-            and download_item.hashString.upper() not in self.servarr.queue
+            record.item
             # Skip items not in this Servarr instance's download directory for this
             # download client
-            and self.download_dir in download_item.path.parents
+            for record in self.download_client.dir_records[self.download_dir]
+            # Skip items still downloading
+            if record.status == "seeding"
+            # Skip items already moving or queued to move
+            and not self.download_client.mover.is_moving(record.hashString)
+            # Skip items known by a Servarr instance in it's queue
+            and record.hashString.upper() not in self.servarr.queue
             # Skip items with no history other than `grabbed` events
             and [
                 history_record
                 for history_record in self.servarr.get_api_paged_records(
                     "history",
-                    downloadId=download_item.hashString.upper(),
+                    downloadId=record.hashString.upper(),
                 )
                 if history_record["eventType"] != "grabbed"
             ]
@@ -265,33 +325,7 @@ class PrunerrServarrDownloadClient:
             str(self.seeding_dir),
             "\n  ".join(repr(download_item) for download_item in download_items),
         )
-        self.download_client.client.move_torrent_data(
-            ids=[download_item.hashString for download_item in download_items],
-            location=self.seeding_dir,
-        )
-        # Wait for a timeout for items to finish moving before proceeding.
-        start = time.time()
-        while next(  # pylint: disable=while-used
-            (
-                download_item
-                for download_item in download_items
-                if download_item.path.exists()
-            ),
-            None,
-        ):
-            if time.time() - start > move_timeout:
-                raise prunerr.downloadclient.DownloadClientTimeout(
-                    f"Timed out waiting for {self.servarr.config['name']} items "
-                    "to finish moving",
-                )
-            time.sleep(1)
-        # Update the download item's dir for subsequent operations, done manually to
-        # minimize requests.
-        for download_item in download_items:
-            download_item._fields["downloadDir"] = download_item._fields[
-                "downloadDir"
-            ]._replace(value=self.seeding_dir)
-            vars(download_item).pop("path", None)
+        self.download_client.mover.request_moves(download_items, self.seeding_dir)
         return [download_item.hashString for download_item in download_items]
 
 
@@ -0,0 +1,176 @@
+# SPDX-FileCopyrightText: 2023 Ross Patterson <me@rpatterson.net>
+# SPDX-License-Identifier: MIT
+
+# pylint: disable=missing-any-param-doc,missing-param-doc,missing-return-doc
+# pylint: disable=missing-return-type-doc,missing-type-doc,missing-yield-doc
+# pylint: disable=missing-yield-type-doc,missing-raises-doc
+
+"""
+Trace nested spans of time across the phases of each loop and the API calls within.
+
+Spans are written as JSON lines, one per span, so that the critical path of a loop and
+the opportunities for concurrency can be found without an external collector.
+"""
+
+import time
+import uuid
+import json
+import functools
+import itertools
+import threading
+import contextlib
+import contextvars
+import logging
+
+from .utils import pathlib
+
+logger = logging.getLogger(__name__)
+
+# The span in which the current code is running, also in background deletion threads
+CURRENT_SPAN = contextvars.ContextVar("prunerr_current_span", default=None)
+# Reusable context manager for when not tracing
+NOT_TRACED = contextlib.nullcontext()
+
+
+class PrunerrSpan:  # pylint: disable=too-few-public-methods
+    """
+    A named span of time within a trace with a parent span, if nested.
+    """
+
+    __slots__ = ("tracer", "trace_id", "span_id", "parent_id", "name", "attributes")
+
+    def __init__(self, tracer, name, parent=None, attributes=None):
+        """
+        Identify the span within the trace of its parent or a new trace.
+        """
+        self.tracer = tracer
+        self.trace_id = uuid.uuid4().hex if parent is None else parent.trace_id
+        self.span_id = next(tracer.span_ids)
+        self.parent_id = None if parent is None else parent.span_id
+        self.name = name
+        self.attributes = attributes or {}
+
+
+class PrunerrTracer:
+    """
+    Write the spans of each traced loop to a JSON lines file when configured.
+
+    Enabled by `daemon/trace/path`.  Each loop of the `daemon` sub-command, or the run
+    of the `exec` sub-command, is a trace whose spans are nested by where the code runs,
+    including background deletion threads.  Each line records the trace, span, and
+    parent span IDs, the name, thread, start time, duration in seconds, and any
+    attributes of one span.
+    """
+
+    trace_file = None
+
+    def __init__(self):
+        """
+        Initialize the span IDs and the lock for writing spans from threads.
+        """
+        self.config = {}
+        self.lock = threading.Lock()
+        self.span_ids = itertools.count(1)
+
+    def __repr__(self):
+        """
+        Readable, informative, and specific representation to ease debugging.
+        """
+        return f"<{type(self).__name__} path={self.config.get('path')!r}>"
+
+    def update(self, config):
+        """
+        Update configuration and open the trace file if enabled.
+        """
+        if (path := config.get("path")) != self.config.get("path"):
+            self.close()
+            if path is not None:
+                trace_path = pathlib.Path(path).expanduser()
+                trace_path.parent.mkdir(parents=True, exist_ok=True)
+                # Kept open across loops, closed when the path changes
+                # pylint: disable-next=consider-using-with
+                self.trace_file = trace_path.open(
+                    "a",
+                    encoding="utf-8",
+                )
+        self.config = config
+
+    def close(self):
+        """
+        Close the trace file.
+        """
+        with self.lock:
+            if self.trace_file is not None:
+                self.trace_file.close()
+                self.trace_file = None
+
+    def trace(self, name, **attributes):
+        """
+        Start a new trace, e.g. for one loop, if tracing is enabled.
+        """
+        if self.trace_file is None:
+            return NOT_TRACED
+        return self.span(name, None, attributes)
+
+    @contextlib.contextmanager
+    def span(self, name, parent=None, attributes=None):
+        """
+        Make a span current for the body and write it when the body finishes.
+        """
+        current = PrunerrSpan(self, name, parent, attributes)
+        token = CURRENT_SPAN.set(current)
+        start_time = time.time()
+        start = time.perf_counter()
+        try:
+            yield current
+        except BaseException as exc:
+            current.attributes["error"] = repr(exc)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            CURRENT_SPAN.reset(token)
+            self.write(current, start_time, duration)
+
+    def write(self, finished, start_time, duration):
+        """
+        Write the finished span as one JSON line.
+        """
+        record = {
+            "trace": finished.trace_id,
+            "span": finished.span_id,
+            "parent": finished.parent_id,
+            "name": finished.name,
+            "thread": threading.current_thread().name,
+            "start": start_time,
+            "duration": duration,
+        }
+        if finished.attributes:
+            record["attributes"] = finished.attributes
+        line = json.dumps(record, default=str)
+        with self.lock:
+            if self.trace_file is None:  # pragma: no cover
+                return
+            self.trace_file.write(f"{line}\n")
+            self.trace_file.flush()
+
+
+def span(name, **attributes):
+    """
+    Nest a span in the current span, if tracing.
+    """
+    if (parent := CURRENT_SPAN.get()) is None:
+        return NOT_TRACED
+    return parent.tracer.span(name, parent, attributes)
+
+
+def traced(method):
+    """
+    Decorate the method to run in a span named for it, if tracing.
+    """
+
+    @functools.wraps(method)
+    def traced_method(*args, **kwargs):
+        with span(method.__qualname__):
+            return method(*args, **kwargs)
+
+    return traced_method
@@ -0,0 +1,181 @@
+# SPDX-FileCopyrightText: 2023 Ross Patterson <me@rpatterson.net>
+# SPDX-License-Identifier: MIT
+
+# pylint: disable=magic-value-comparison,missing-any-param-doc,missing-param-doc
+# pylint: disable=missing-return-doc,missing-return-type-doc,missing-type-doc
+
+"""
+Verify corrupt download items and resume them once they've finished verifying.
+"""
+
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PrunerrVerifier:
+    """
+    Queue corrupt download items to verify per filesystem and track their progress.
+    """
+
+    # Only the fields needed to poll verifying items, in a consistent order
+    VERIFY_FIELDS = [
+        "id",
+        "hashString",
+        "status",
+        "error",
+        "errorString",
+        "recheckProgress",
+    ]
+    # Bounds on the seconds between polling verifying items
+    VERIFY_WAIT_MIN = 1
+    VERIFY_WAIT_MAX = 60
+
+    def __init__(self, download_client):
+        """
+        Capture a reference to the download client and initialize the tracked items.
+        """
+        self.download_client = download_client
+        self.verifying_items = {}
+        self.verifying_progress = {}
+        self.verify_started = set()
+
+    def __repr__(self):
+        """
+        Readable, informative, and specific representation to ease debugging.
+        """
+        return f"<{type(self).__name__} verifying={len(self.verifying_items)!r}>"
+
+    def verify_corrupt_items(self):
+        """
+        Verify and resume download items flagged as having corrupt data.
+
+        Verifying many items at once thrashes the disks, so queue corrupt items and only
+        verify up to a limit at once per filesystem.  Start verifying the highest
+        priority and then smallest items first.  Queued items are started as earlier
+        verifications finish.
+        """
+        corrupt_items = [
+            record.item
+            for record in self.download_client.records
+            if record.hashString not in self.verifying_items
+            and record.hashString not in self.verify_started
+            and record.error == 3
+            and (
+                "verif" in record.errorString.lower()
+                or "corrput" in record.errorString.lower()
+            )
+        ]
+        if not corrupt_items:
+            return None
+        devices_verifying = {}
+        for verifying_item in self.verifying_items.values():
+            device = self.download_client.get_device(verifying_item.downloadDir)
+            devices_verifying[device] = devices_verifying.get(device, 0) + 1
+        verify_items = {}
+        for item in reversed(
+            self.download_client.sort_items_by_tracker(
+                sorted(corrupt_items, key=lambda item: item.totalSize, reverse=True),
+            ),
+        ):
+            device = self.download_client.get_device(item.downloadDir)
+            if (
+                devices_verifying.get(device, 0)
+                < self.download_client.config["max-verifying-per-device"]
+            ):
+                verify_items[item.hashString] = item
+                devices_verifying[device] = devices_verifying.get(device, 0) + 1
+        if len(verify_items) < len(corrupt_items):
+            logger.info(
+                "Queued corrupt download items to verify later: %s",
+                len(corrupt_items) - len(verify_items),
+            )
+        if not verify_items:
+            return None
+        logger.info(
+            "Verifying corrupt download items:\n  %s",
+            "\n  ".join(repr(item) for item in verify_items.values()),
+        )
+        self.download_client.client.verify_torrent(list(verify_items.keys()))
+        self.verifying_items.update(verify_items)
+        self.verify_started.update(verify_items.keys())
+        return list(verify_items.keys())
+
+    def resume_verified_items(self):
+        """
+        Resume downloading any previously corrupt items that have finished verifying.
+
+        Poll all verifying items in one request for only the fields needed.
+        """
+        if not self.verifying_items:
+            return {}
+        polled = time.time()
+        verifying_torrents = (
+            self.download_client.client._request(  # pylint: disable=protected-access
+                "torrent-get",
+                {"fields": self.VERIFY_FIELDS},
+                list(self.verifying_items.keys()),
+            )
+        )
+        for verifying_torrent in verifying_torrents.values():
+            # Estimate the time left from the verification progress since the last poll
+            seconds_left = None
+            if (
+                last_poll := self.verifying_progress.get(verifying_torrent.hashString)
+            ) and (progress := verifying_torrent.recheckProgress - last_poll[1]) > 0:
+                seconds_left = (1 - verifying_torrent.recheckProgress) / (
+                    progress / (polled - last_poll[0])
+                )
+            self.verifying_progress[verifying_torrent.hashString] = (
+                polled,
+                verifying_torrent.recheckProgress,
+                seconds_left,
+            )
+            verifying_item = self.verifying_items[verifying_torrent.hashString]
+            verifying_item._update_fields(  # pylint: disable=protected-access
+                verifying_torrent,
+            )
+        for item_hash in set(self.verifying_items.keys()) - {
+            verifying_torrent.hashString
+            for verifying_torrent in verifying_torrents.values()
+        }:
+            logger.warning(
+                "Verifying download item removed from download client: %r",
+                self.verifying_items.pop(item_hash),
+            )
+            self.verifying_progress.pop(item_hash, None)
+        verified_items = {
+            item_hash: verifying_item
+            for item_hash, verifying_item in self.verifying_items.items()
+            if not verifying_item.status.startswith("check")
+        }
+        if verified_items:
+            logger.info(
+                "Resuming verified download items:\n  %s",
+                "\n  ".join(repr(item) for item in verified_items.values()),
+            )
+            self.download_client.client.start_torrent(list(verified_items.keys()))
+            for item_hash in verified_items.keys():
+                del self.verifying_items[item_hash]
+                self.verifying_progress.pop(item_hash, None)
+        return verified_items
+
+    def verify_wait(self):
+        """
+        Return how long to wait before polling verifying items again.
+
+        Back off to half of the shortest estimated time left for any verifying item
+        based on its progress between polls.
+        """
+        seconds_left = [
+            verifying_progress[2]
+            for verifying_progress in self.verifying_progress.values()
+            if verifying_progress[2] is not None
+        ]
+        if not seconds_left:
+            return self.VERIFY_WAIT_MIN
+        return min(
+            max(min(seconds_left) / 2, self.VERIFY_WAIT_MIN),
+            self.VERIFY_WAIT_MAX,
+        )
@@ -8,11 +8,9 @@
 Tests for Prunerr.
 """
 
-import sys
 import os
 import functools
 import re
-import subprocess  # nosec B404
 import mimetypes
 import email.utils
 import email.message
@@ -173,6 +171,9 @@ class PrunerrTestCase(
         for download_client_url in self.download_client_urls:
             self.set_up_download_item_files(download_client_url)
 
+        # Moves requested from the download client that haven't finished yet
+        self.delayed_moves = []
+
         # Mock HTTP/S requests:
         # https://requests-mock.readthedocs.io/en/latest/fixture.html#fixtures
         self.requests_mock = requests_mock.Mocker()
@@ -508,32 +509,39 @@ class PrunerrTestCase(
         request=None,
         context=None,
         response_mock=None,
-        delay=0,
+        delay=False,
     ):
         """
         Simulate the download client changing a download items location.
+
+        Optionally delay moving the item until the download client is next asked about
+        the item's location, see `mock_moved_torrent_response()`.
         """
         location = pathlib.Path(request.json()["arguments"]["location"])
         location.mkdir(parents=True, exist_ok=True)
         dst = location / self.downloaded_item.name
         if delay:
-            # Simulate a delay using a subprocess
-            self.addCleanup(
-                subprocess.Popen(  # nosec B603, pylint: disable=consider-using-with
-                    args=[
-                        sys.executable,
-                        "-c",
-                        "import pathlib; "
-                        f"import time; time.sleep({delay}); "
-                        f"pathlib.Path('{self.downloaded_item}').rename('{dst}');",
-                    ],
-                ).communicate,
-            )
+            self.delayed_moves.append((self.downloaded_item, dst))
         else:
             self.downloaded_item.rename(dst)
         context.headers.update(response_mock.get("headers", {}))
         return response_mock["from_mock_dir"]["json"]
 
+    def mock_moved_torrent_response(
+        self,
+        request=None,  # pylint: disable=unused-argument
+        context=None,
+        response_mock=None,
+    ):
+        """
+        Simulate the download client finishing any delayed moves before responding.
+        """
+        while self.delayed_moves:  # pylint: disable=while-used
+            src, dst = self.delayed_moves.pop(0)
+            src.rename(dst)
+        context.headers.update(response_mock.get("headers", {}))
+        return response_mock["from_mock_dir"]["json"]
+
     def mock_servarr_import_item(self, download_item=None):
         """
         Simulate Servarr importing a downloaded item, hardlink files into the library.
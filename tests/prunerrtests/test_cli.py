@@ -12,6 +12,7 @@ import runpy
 import subprocess  # nosec B404
 import contextlib
 import pathlib
+import json
 
 from unittest import mock
 
@@ -92,6 +93,61 @@ class PrunerrCLITests(prunerrtests.PrunerrTestCase):
         )
         self.assert_request_mocks(request_mocks)
 
+    def test_cli_profile_operations(self):
+        """
+        The command line script can output a profile of operations with the results.
+        """
+        request_mocks = self.mock_responses()
+        stdout_file = io.StringIO()
+        with contextlib.redirect_stdout(stdout_file):
+            prunerr.main(
+                args=[f"--config={self.CONFIG}", "exec", "--profile-operations"],
+            )
+        self.assert_request_mocks(request_mocks)
+        results = json.loads(stdout_file.getvalue())
+        self.assertIn(
+            self.DOWNLOAD_CLIENT_URL,
+            results["profile-operations"],
+            "Operations profile missing from the results",
+        )
+        self.assertIn(
+            "items",
+            results["profile-operations"][self.DOWNLOAD_CLIENT_URL],
+            "Item explanations missing from the operations profile",
+        )
+
+    def test_cli_stats(self):
+        """
+        The command line script can output API call statistics with the results.
+        """
+        request_mocks = self.mock_responses()
+        stdout_file = io.StringIO()
+        with contextlib.redirect_stdout(stdout_file):
+            prunerr.main(args=["--stats", f"--config={self.CONFIG}", "exec"])
+        self.assert_request_mocks(request_mocks)
+        stats = json.loads(stdout_file.getvalue())["stats"]
+        torrent_get_stats = stats["transmission"]["torrent-get"]
+        self.assertGreater(
+            torrent_get_stats["calls"],
+            0,
+            "Download client calls missing from the stats",
+        )
+        self.assertGreater(
+            torrent_get_stats["response-bytes"],
+            0,
+            "Download client response sizes missing from the stats",
+        )
+        self.assertEqual(
+            torrent_get_stats["histogram"]["+Inf"],
+            torrent_get_stats["calls"],
+            "Wrong download client response time histogram",
+        )
+        self.assertIn(
+            "GET queue",
+            stats["servarr"],
+            "Servarr calls missing from the stats",
+        )
+
     def test_cli_option_errors(self):
         """
         The command line script displays useful messages for invalid option values.
@@ -0,0 +1,297 @@
+# SPDX-FileCopyrightText: 2023 Ross Patterson <me@rpatterson.net>
+# SPDX-License-Identifier: MIT
+
+"""
+Prunerr deletes download item files in the background when configured.
+"""
+
+import os
+import shutil
+import threading
+import types
+import concurrent.futures
+import json
+
+from unittest import mock
+
+import prunerrtests
+
+import prunerr.runner
+import prunerr.deleter
+
+
+@mock.patch.dict(os.environ, prunerrtests.PrunerrTestCase.ENV)
+class PrunerrDeleterTests(prunerrtests.PrunerrTestCase):
+    """
+    Prunerr deletes download item files in the background when configured.
+    """
+
+    def setUp(self):
+        """
+        Configure a deleter with background workers and a path to delete.
+        """
+        super().setUp()
+        self.deleted_item = self.storage_dir / "deleted" / self.EXAMPLE_VIDEO.stem
+        self.deleted_item.mkdir(parents=True)
+        shutil.copy2(self.EXAMPLE_VIDEO, self.deleted_item / self.EXAMPLE_VIDEO.name)
+        self.runner = prunerr.runner.PrunerrRunner(self.CONFIG)
+        self.deletion_config = dict(
+            self.runner.example_confg["deletion"],
+            workers=2,
+            journal=str(self.tmp_path / "deletions.json"),
+        )
+        self.deleter = prunerr.deleter.PrunerrDeleter(self.runner)
+
+    def tearDown(self):
+        """
+        Stop the background workers.
+        """
+        if self.deleter.executor is not None:
+            self.deleter.executor.shutdown()
+        super().tearDown()
+
+    def test_deleter_synchronous(self):
+        """
+        Without workers, paths are deleted before returning.
+        """
+        self.deleter.update(self.runner.example_confg["deletion"])
+        self.assertIsNone(
+            self.deleter.submit(self.deleted_item, 1),
+            "Synchronous deletion returned a future",
+        )
+        self.assertFalse(
+            self.deleted_item.exists(),
+            "Synchronous deletion didn't delete the path",
+        )
+        self.assertEqual(
+            self.deleter.pending_size(self.storage_dir),
+            0,
+            "Synchronous deletion counted as pending",
+        )
+
+    def test_deleter_background(self):
+        """
+        With workers, paths are deleted in the background and counted as free space.
+        """
+        self.deleter.update(self.deletion_config)
+        deleting = threading.Event()
+        with mock.patch(
+            "prunerr.downloadclient.delete_path",
+            side_effect=lambda path: deleting.wait(),
+        ) as delete_path:
+            self.deleter.submit(self.deleted_item, 1024)
+            self.assertEqual(
+                json.loads(self.deleter.journal_path.read_text(encoding="utf-8")),
+                {str(self.deleted_item): 1024},
+                "Pending deletion missing from the journal",
+            )
+            self.assertEqual(
+                self.deleter.pending_size(self.storage_dir),
+                1024,
+                "Pending deletion not counted as free space",
+            )
+            deleting.set()
+            self.deleter.wait()
+        delete_path.assert_called_once_with(self.deleted_item)
+        self.assertEqual(
+            self.deleter.pending_size(self.storage_dir),
+            1024,
+            "Completed deletion not counted until sessions are refreshed",
+        )
+        self.assertEqual(
+            json.loads(self.deleter.journal_path.read_text(encoding="utf-8")),
+            {},
+            "Completed deletion still in the journal",
+        )
+        self.deleter.forget_completed(self.deleter.get_completed())
+        self.assertEqual(
+            self.deleter.pending_size(self.storage_dir),
+            0,
+            "Completed deletion still counted after sessions are refreshed",
+        )
+
+    def test_deleter_refresh_completed(self):
+        """
+        Deletions completed while refreshing sessions are still counted afterward.
+        """
+        self.deleter.update(self.deletion_config)
+        deleting = threading.Event()
+        with mock.patch(
+            "prunerr.downloadclient.delete_path",
+            side_effect=lambda path: deleting.wait(),
+        ):
+            self.deleter.submit(self.deleted_item, 1024)
+            completed = self.deleter.get_completed()
+            deleting.set()
+            self.deleter.wait()
+        self.deleter.forget_completed(completed)
+        self.assertEqual(
+            self.deleter.pending_size(self.storage_dir),
+            1024,
+            "Deletion completed while refreshing not counted",
+        )
+
+    def test_deleter_pending_once(self):
+        """
+        Paths already pending deletion aren't submitted again nor counted twice.
+        """
+        self.deleter.update(self.deletion_config)
+        deleting = threading.Event()
+        with mock.patch(
+            "prunerr.downloadclient.delete_path",
+            side_effect=lambda path: deleting.wait(),
+        ) as delete_path:
+            future = self.deleter.submit(self.deleted_item, 1024)
+            self.assertIs(
+                self.deleter.submit(self.deleted_item, 1024),
+                future,
+                "Pending deletion submitted again",
+            )
+            self.assertEqual(
+                self.deleter.get_pending_paths(),
+                {self.deleted_item},
+                "Wrong paths pending deletion",
+            )
+            self.assertEqual(
+                self.deleter.pending_size(self.storage_dir),
+                1024,
+                "Pending deletion counted twice",
+            )
+            deleting.set()
+            self.deleter.wait()
+        delete_path.assert_called_once_with(self.deleted_item)
+        self.assertEqual(
+            self.deleter.get_pending_paths(),
+            set(),
+            "Completed deletion still pending",
+        )
+
+    def test_deleter_devices(self):
+        """
+        Deletions waiting on one busy device don't delay deletions on other devices.
+        """
+        self.deleter.update(self.deletion_config)
+        busy_item = self.deleted_item.with_name("busy")
+        queued_item = self.deleted_item.with_name("queued")
+        devices = {busy_item: 1, queued_item: 1, self.deleted_item: 2}
+        deleting = threading.Event()
+        with mock.patch.object(
+            type(self.deleted_item),
+            "lstat",
+            autospec=True,
+            side_effect=lambda path: types.SimpleNamespace(st_dev=devices[path]),
+        ), mock.patch(
+            "prunerr.downloadclient.delete_path",
+            side_effect=lambda path: path != busy_item or deleting.wait(),
+        ):
+            busy_future = self.deleter.submit(busy_item, 1024)
+            queued_future = self.deleter.submit(queued_item, 1024)
+            try:  # pylint: disable=too-many-try-statements
+                other_done, _ = concurrent.futures.wait(
+                    [self.deleter.submit(self.deleted_item, 1024)],
+                    timeout=10,
+                )
+                self.assertTrue(
+                    other_done,
+                    "Deletion on another device not completed",
+                )
+                self.assertFalse(
+                    queued_future.done(),
+                    "Deletion over the limit for the device not queued",
+                )
+            finally:
+                deleting.set()
+            self.deleter.wait()
+        self.assertTrue(
+            busy_future.result() and queued_future.result(),
+            "Queued deletion not completed",
+        )
+
+    def test_deleter_error(self):
+        """
+        Space isn't counted as free when deleting in the background fails.
+        """
+        self.deleter.update(self.deletion_config)
+        with mock.patch(
+            "prunerr.downloadclient.delete_path",
+            side_effect=PermissionError,
+        ), self.assertLogs(prunerr.deleter.logger) as logged_msgs:
+            self.deleter.submit(self.deleted_item, 1024)
+            self.deleter.wait()
+        self.assertIn(
+            "Error deleting",
+            logged_msgs.records[0].message,
+            "Wrong logged record message",
+        )
+        self.assertEqual(
+            self.deleter.pending_size(self.storage_dir),
+            0,
+            "Failed deletion counted as free space",
+        )
+        self.assertEqual(
+            json.loads(self.deleter.journal_path.read_text(encoding="utf-8")),
+            {},
+            "Failed deletion still in the journal",
+        )
+
+    def test_deleter_resume(self):
+        """
+        Deletions interrupted by a restart resume from the journal.
+        """
+        missing_path = self.tmp_path / "already-deleted"
+        self.tmp_path.joinpath("deletions.json").write_text(
+            json.dumps({str(self.deleted_item): 1024, str(missing_path): 1}),
+            encoding="utf-8",
+        )
+        self.deleter.update(self.deletion_config)
+        self.deleter.wait()
+        self.assertFalse(
+            self.deleted_item.exists(),
+            "Interrupted deletion not resumed",
+        )
+        self.assertEqual(
+            json.loads(self.deleter.journal_path.read_text(encoding="utf-8")),
+            {},
+            "Resumed deletion still in the journal",
+        )
+
+    def test_deleter_truncate(self):
+        """
+        Large files are truncated in chunks and the freed space reported as it goes.
+        """
+        item_file = self.deleted_item / self.EXAMPLE_VIDEO.name
+        imported_file = self.deleted_item / f"imported{self.EXAMPLE_VIDEO.suffix}"
+        shutil.copy2(self.EXAMPLE_VIDEO, imported_file)
+        os.link(imported_file, self.tmp_path / imported_file.name)
+        size = item_file.stat().st_size
+        deletion_config = dict(
+            self.deletion_config,
+            **{
+                "truncate-min-size": 1,
+                "truncate-chunk-size": size // 3 + 1,
+                "truncate-pause": 0,
+            },
+        )
+        freed = []
+        with mock.patch("os.truncate", wraps=os.truncate) as truncate:
+            prunerr.deleter.delete_path(
+                self.deleted_item,
+                deletion_config,
+                freed.append,
+            )
+        self.assertEqual(
+            [truncate_call.args for truncate_call in truncate.call_args_list],
+            [
+                (item_file, size - (size // 3 + 1)),
+                (item_file, size - 2 * (size // 3 + 1)),
+                (item_file, 0),
+            ],
+            "Wrong truncation steps",
+        )
+        self.assertEqual(sum(freed), size, "Wrong truncated space reported")
+        self.assertFalse(self.deleted_item.exists(), "Truncated item not deleted")
+        self.assertEqual(
+            (self.tmp_path / imported_file.name).stat().st_size,
+            self.EXAMPLE_VIDEO.stat().st_size,
+            "Hard linked file truncated",
+        )
@@ -257,3 +257,27 @@ class PrunerrDownloadClientTests(prunerrtests.PrunerrTestCase):
             str(exc_context.exception),
             "Wrong missing config URL validation error message",
         )
+
+    def test_download_client_item_queue(self):
+        """
+        Queued download items pop in the same order as sorting, each key used once.
+        """
+        items = [(1, "a"), (3, "b"), (2, "c"), (3, "d"), (1, "e")]
+        item_key = mock.Mock(side_effect=lambda item: (item[0],))
+        item_queue = prunerr.downloadclient.PrunerrItemQueue(items, key=item_key)
+        self.assertEqual(
+            item_queue.pop(),
+            (3, "b"),
+            "Wrong first queued download item",
+        )
+        self.assertEqual(
+            list(item_queue),
+            sorted(items, key=lambda item: (item[0],), reverse=True)[1:],
+            "Wrong order for the rest of the queued download items",
+        )
+        self.assertEqual(
+            item_key.call_count,
+            len(items),
+            "Queued download item keys not evaluated exactly once each",
+        )
+        self.assertEqual(len(item_queue), 0, "Iterating didn't empty the queue")
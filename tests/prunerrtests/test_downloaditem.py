@@ -112,3 +112,136 @@ class PrunerrDownloadItemTests(prunerrtests.PrunerrTestCase):
             0,
             "Wrong download item total download rate",
         )
+
+    def test_download_item_adopts_fields(self):
+        """
+        Download items share the field storage of the RPC client's parsed items.
+        """
+        runner = prunerr.runner.PrunerrRunner(config=self.CONFIG)
+        self.mock_responses()
+        runner.update()
+        download_client = runner.download_clients[self.DOWNLOAD_CLIENT_URL]
+        download_item = download_client.items[0]
+        adopted_item = prunerr.downloaditem.PrunerrDownloadItem(
+            download_client,
+            download_client.client,
+            download_item,
+        )
+        self.assertIs(
+            adopted_item._fields,  # pylint: disable=protected-access
+            download_item._fields,  # pylint: disable=protected-access
+            "Download item copied the field storage",
+        )
+        parsed_item = prunerr.downloaditem.PrunerrDownloadItem(
+            download_client,
+            download_client.client,
+            self.download_client_items_responses[self.DOWNLOAD_CLIENT_URL]["arguments"][
+                "torrents"
+            ][0],
+        )
+        self.assertEqual(
+            parsed_item.hashString,
+            download_item.hashString,
+            "Wrong download item parsed from raw RPC JSON",
+        )
+
+    def test_download_item_records(self):
+        """
+        Download item records only materialize full download items as needed.
+        """
+        runner = prunerr.runner.PrunerrRunner(config=self.CONFIG)
+        self.mock_responses()
+        runner.update()
+        download_client = runner.download_clients[self.DOWNLOAD_CLIENT_URL]
+        record = download_client.records[0]
+        self.assertIsNone(
+            record._item,  # pylint: disable=protected-access
+            "Download item materialized before needed",
+        )
+        self.assertEqual(
+            record.status,
+            "seeding",
+            "Wrong download item record status",
+        )
+        self.assertIs(
+            record.item,
+            download_client.items[0],
+            "Download item materialized more than once",
+        )
+        self.assertIs(
+            record.item._fields,  # pylint: disable=protected-access
+            record.torrent._fields,  # pylint: disable=protected-access
+            "Download item and record don't share field storage",
+        )
+
+    def test_download_item_resolved_dirs(self):
+        """
+        Download items share resolved download directories until they change.
+        """
+        runner = prunerr.runner.PrunerrRunner(config=self.CONFIG)
+        self.mock_responses()
+        runner.update()
+        download_client = runner.download_clients[self.DOWNLOAD_CLIENT_URL]
+        download_item = download_client.items[0]
+        self.assertEqual(
+            download_item.path,
+            download_client.resolve_dir(download_item.download_dir)
+            / download_item.root_name,
+            "Wrong download item path",
+        )
+        self.assertIn(
+            download_item.download_dir,
+            download_client.resolved_dirs,
+            "Download item directory not cached",
+        )
+
+        # Changing the target of a symbolic link invalidates the cached directory
+        first_target = self.tmp_path / "first-target"
+        first_target.mkdir()
+        second_target = self.tmp_path / "second-target"
+        second_target.mkdir()
+        link = self.tmp_path / "link"
+        link.symlink_to(first_target)
+        self.assertEqual(
+            download_client.resolve_dir(str(link)),
+            first_target,
+            "Wrong resolved symbolic link directory",
+        )
+        link.unlink()
+        link.symlink_to(second_target)
+        self.assertEqual(
+            download_client.resolve_dir(str(link)),
+            first_target,
+            "Resolved directory not cached",
+        )
+        download_client.forget_resolved_dirs(first_target)
+        self.assertEqual(
+            download_client.resolve_dir(str(link)),
+            second_target,
+            "Resolved symbolic link directory not invalidated",
+        )
+
+    def test_download_item_dir_records(self):
+        """
+        Download item records are indexed by the managed directories that contain them.
+        """
+        runner = prunerr.runner.PrunerrRunner(config=self.CONFIG)
+        self.mock_responses()
+        runner.update()
+        download_client = runner.download_clients[self.DOWNLOAD_CLIENT_URL]
+        self.assertIn(
+            download_client.seeding_dir,
+            download_client.dir_records,
+            "Download client seeding directory not indexed",
+        )
+        for managed_dir, dir_records in download_client.dir_records.items():
+            with self.subTest(managed_dir=managed_dir):
+                self.assertEqual(
+                    [record.hashString for record in dir_records],
+                    [
+                        record.hashString
+                        for record in download_client.records
+                        if managed_dir in record.item.path.parents
+                    ],
+                    "Wrong download item records indexed for directory",
+                )
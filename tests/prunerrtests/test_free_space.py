@@ -7,6 +7,7 @@ Prunerr removes imported items to free space according to configured rules.
 
 import os
 import shutil
+import types
 import logging
 
 from unittest import mock
@@ -281,6 +282,81 @@ class PrunerrFreeSpaceTests(prunerrtests.PrunerrTestCase):
             "Free space orphan results wrong number of items",
         )
 
+    def test_free_space_orphans_moving(self):
+        """
+        Prunerr doesn't delete files still being moved by another download client.
+        """
+        shutil.copy2(
+            self.EXAMPLE_VIDEO,
+            self.servarr_seeding_dir / self.EXAMPLE_VIDEO.name,
+        )
+        # Partially copied by a move across filesystems, smaller than the orphan
+        moving_item_file = self.servarr_seeding_dir / "Moving Item" / "Moving Item.mkv"
+        moving_item_file.parent.mkdir()
+        moving_item_file.write_bytes(self.EXAMPLE_VIDEO.read_bytes()[:1024])
+        self.mock_responses(self.RESPONSES_DIR.parent / "free-space-orphans")
+        runner = prunerr.runner.PrunerrRunner(self.CONFIG)
+        runner.update()
+        # A second download client with sufficient free space whose move is still
+        # copying, e.g. on another filesystem or after waiting timed out
+        moving_download_client = prunerr.downloadclient.PrunerrDownloadClient(runner)
+        moving_download_client.client = mock.Mock()
+        moving_download_client.records = []
+        moving_download_client.mover.moving_items["moving"] = (
+            types.SimpleNamespace(hashString="moving", root_name="Moving Item"),
+            self.servarr_seeding_dir,
+        )
+        runner.download_clients[
+            "http://other:9091/transmission/"
+        ] = moving_download_client
+        with mock.patch.object(
+            moving_download_client,
+            "free_space_maybe_resume",
+            return_value=True,
+        ), mock.patch.object(
+            moving_download_client.mover,
+            "wait_moves",
+            return_value=[],
+        ):
+            orphans_results = runner.free_space()
+        self.assertEqual(
+            orphans_results[prunerr.utils.normalize_url(self.download_client_urls[0])],
+            [str(self.servarr_seeding_dir / self.EXAMPLE_VIDEO.name)],
+            "Wrong orphans deleted while another download client is moving",
+        )
+        self.assertTrue(
+            moving_item_file.is_file(),
+            "Deleted file still being moved by another download client",
+        )
+
+    def test_free_space_orphans_deleting(self):
+        """
+        Prunerr doesn't consider files still being deleted in the background orphans.
+        """
+        shutil.copy2(
+            self.EXAMPLE_VIDEO,
+            self.servarr_seeding_dir / self.EXAMPLE_VIDEO.name,
+        )
+        deleting_item_file = (
+            self.servarr_seeding_dir / "Deleting Item" / "Deleting Item.mkv"
+        )
+        deleting_item_file.parent.mkdir()
+        deleting_item_file.write_bytes(self.EXAMPLE_VIDEO.read_bytes()[:1024])
+        self.mock_responses(self.RESPONSES_DIR.parent / "free-space-orphans")
+        runner = prunerr.runner.PrunerrRunner(self.CONFIG)
+        runner.update()
+        with mock.patch.object(
+            runner.deleter,
+            "get_pending_paths",
+            return_value={deleting_item_file.parent},
+        ):
+            orphans = runner.find_orphans()
+        self.assertEqual(
+            [file_path for _, file_path, _ in orphans],
+            [self.servarr_seeding_dir / self.EXAMPLE_VIDEO.name],
+            "Wrong orphans found while deleting in the background",
+        )
+
     def test_free_remaining_downloads(self):
         """
         Prunerr logs how much space is required for remaining downloads.
@@ -0,0 +1,109 @@
+# SPDX-FileCopyrightText: 2023 Ross Patterson <me@rpatterson.net>
+# SPDX-License-Identifier: MIT
+
+"""
+Prunerr traces the memory it uses in each loop when enabled.
+"""
+
+import os
+import tracemalloc
+
+from unittest import mock
+
+import prunerrtests
+
+import prunerr.runner
+import prunerr.memory
+
+
+@mock.patch.dict(os.environ, prunerrtests.PrunerrTestCase.ENV)
+class PrunerrMemoryTests(prunerrtests.PrunerrTestCase):
+    """
+    Prunerr traces the memory it uses in each loop when enabled.
+    """
+
+    def setUp(self):
+        """
+        Start tracing memory allocations.
+        """
+        super().setUp()
+        self.runner = prunerr.runner.PrunerrRunner(self.CONFIG)
+        self.memory_config = dict(
+            self.runner.example_confg["daemon"]["memory"],
+            trace=True,
+            # Fewer frames to keep the tests fast
+            frames=10,
+        )
+        self.runner.memory.update(self.memory_config)
+        self.addCleanup(tracemalloc.stop)
+
+    def test_memory_modules(self):
+        """
+        Memory still allocated is reported by the Prunerr module that allocated it.
+        """
+        self.mock_responses()
+        # Keep tracing despite the example configuration
+        with mock.patch.object(self.runner.memory, "update"):
+            with self.runner.phase("update"):
+                self.runner.update()
+        modules = self.runner.memory.check()
+        self.assertIn(
+            prunerr.downloadclient.__name__,
+            modules,
+            "Memory allocated by a Prunerr module not reported",
+        )
+        self.assertGreaterEqual(
+            self.runner.memory.phases["update"]["traced-peak"],
+            modules[prunerr.downloadclient.__name__],
+            "Phase peak less than the memory still allocated after the phase",
+        )
+
+    def test_memory_phase_peaks(self):
+        """
+        Each phase records its own peak, including the peaks of nested phases.
+        """
+        size = 2**24
+        with self.runner.phase("outer"):
+            # Write to the memory so that it's resident
+            allocated = b"\0" * size
+            del allocated
+            with self.runner.phase("inner"):
+                pass
+        self.assertGreaterEqual(
+            self.runner.memory.phases["outer"]["traced-peak"],
+            size,
+            "Peak before a nested phase lost",
+        )
+        self.assertLess(
+            self.runner.memory.phases["inner"]["traced-peak"],
+            size,
+            "Peak before a nested phase counted in the nested phase",
+        )
+        self.assertGreater(
+            self.runner.memory.phases["inner"]["resident-peak"],
+            0,
+            "Peak resident size not recorded",
+        )
+        if prunerr.memory.reset_resident_peak():
+            self.assertGreaterEqual(
+                self.runner.memory.phases["outer"]["resident-peak"]
+                - self.runner.memory.phases["inner"]["resident-peak"],
+                size // 2,
+                "Peak resident size before a nested phase counted in the nested phase",
+            )
+
+    def test_memory_budget(self):
+        """
+        Exceeding the memory budget logs an error or exits as configured.
+        """
+        self.runner.memory.update(dict(self.memory_config, budget=1))
+        with self.assertLogs(prunerr.memory.logger, level="ERROR"):
+            self.runner.memory.check()
+        self.runner.memory.update(
+            dict(self.memory_config, budget=1, **{"budget-action": "exit"}),
+        )
+        with self.assertRaises(
+            prunerr.memory.PrunerrMemoryBudgetError,
+            msg="Exceeding the memory budget didn't exit",
+        ):
+            self.runner.memory.check()
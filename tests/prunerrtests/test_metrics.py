@@ -0,0 +1,152 @@
+# SPDX-FileCopyrightText: 2023 Ross Patterson <me@rpatterson.net>
+# SPDX-License-Identifier: MIT
+
+"""
+Prunerr collects metrics about each loop and serves them for Prometheus.
+"""
+
+import os
+import urllib.request
+
+from unittest import mock
+
+import requests
+
+import prunerrtests
+
+import prunerr.runner
+import prunerr.metrics
+
+
+@mock.patch.dict(os.environ, prunerrtests.PrunerrTestCase.ENV)
+class PrunerrMetricsTests(prunerrtests.PrunerrTestCase):
+    """
+    Prunerr collects metrics about each loop and serves them for Prometheus.
+    """
+
+    def test_metrics_exec(self):
+        """
+        Running the order of operations records phases, API requests, and items.
+        """
+        request_mocks = self.mock_responses()
+        runner = prunerr.runner.PrunerrRunner(self.CONFIG)
+        runner.update()
+        runner.exec_()
+        self.assert_request_mocks(request_mocks)
+        metrics = runner.metrics.render()
+        for phase in ("verify", "move", "free-space"):
+            self.assertIn(
+                f'prunerr_phase_duration_seconds_count{{phase="{phase}"}} 1\n',
+                metrics,
+                f"Phase {phase!r} duration missing from the metrics",
+            )
+        self.assertIn(
+            'prunerr_rpc_requests_total{endpoint="torrent-get",'
+            'service="transmission"} ',
+            metrics,
+            "Download client requests missing from the metrics",
+        )
+        self.assertIn(
+            'prunerr_rpc_requests_total{endpoint="GET queue",service="servarr"} ',
+            metrics,
+            "Servarr requests missing from the metrics",
+        )
+        self.assertIn(
+            'prunerr_rpc_duration_seconds_bucket{endpoint="torrent-get",'
+            'service="transmission",le="+Inf"} ',
+            metrics,
+            "Download client response time histogram missing from the metrics",
+        )
+        self.assertIn(
+            'prunerr_rpc_retries_total{endpoint="session-get",'
+            'service="transmission"} 0\n',
+            metrics,
+            "Download client retries missing from the metrics",
+        )
+        self.assertIn(
+            f'prunerr_items{{download_client="{self.DOWNLOAD_CLIENT_URL}",',
+            metrics,
+            "Download items per status missing from the metrics",
+        )
+        self.assertIn(
+            f'prunerr_free_space_bytes{{download_client="{self.DOWNLOAD_CLIENT_URL}",',
+            metrics,
+            "Free space missing from the metrics",
+        )
+
+    def test_metrics_rpc_retries(self):
+        """
+        API requests sent again within one call are counted as retries.
+        """
+        metrics = prunerr.metrics.PrunerrMetrics()
+        session = requests.Session()
+        responses = prunerr.metrics.PrunerrRPCResponses(session)
+        with metrics.rpc("transmission", "torrent-get", responses):
+            # As if the first response asked for a new Transmission session ID
+            for content in (b"", b'{"result": "success"}'):
+                response = requests.Response()
+                response._content = content  # pylint: disable=protected-access
+                for hook in session.hooks["response"]:
+                    hook(response)
+        self.assertEqual(
+            metrics.rpc_stats()["transmission"]["torrent-get"],
+            dict(
+                metrics.rpc_stats()["transmission"]["torrent-get"],
+                calls=1,
+                retries=1,
+                **{"response-bytes": 21},
+            ),
+            "Wrong API call retries or response sizes",
+        )
+
+    def test_metrics_serve(self):
+        """
+        The metrics are served in the Prometheus text format when configured.
+        """
+        metrics = prunerr.metrics.PrunerrMetrics()
+        self.assertIsNone(
+            metrics.update(self.runner_example_metrics_config()),
+            "Metrics served without a port configured",
+        )
+        metrics.inc(
+            "prunerr_deletions_total",
+            download_client='http://"quoted"/',
+            kind="orphan",
+        )
+        metrics.inc("prunerr_freed_bytes_total", 1024, kind="orphan")
+        server = metrics.update(dict(self.runner_example_metrics_config(), port=0))
+        self.addCleanup(metrics.shutdown)
+        with urllib.request.urlopen(  # nosec B310
+            f"http://127.0.0.1:{server.server_address[1]}/metrics",
+        ) as response:
+            self.assertEqual(
+                response.headers["Content-Type"],
+                "text/plain; version=0.0.4; charset=utf-8",
+                "Wrong metrics content type",
+            )
+            body = response.read().decode("utf-8")
+        self.assertEqual(
+            body,
+            """\
+# HELP prunerr_deletions_total Download items and orphaned files deleted.
+# TYPE prunerr_deletions_total counter
+prunerr_deletions_total{download_client="http://\\"quoted\\"/",kind="orphan"} 1
+# HELP prunerr_freed_bytes_total Estimated bytes freed by deleting download items \
+and orphaned files.
+# TYPE prunerr_freed_bytes_total counter
+prunerr_freed_bytes_total{kind="orphan"} 1024
+""",
+            "Wrong metrics served",
+        )
+
+    def runner_example_metrics_config(self) -> dict:
+        """
+        Return the default metrics configuration from the example configuration.
+
+        :return: A copy of the example `daemon/metrics` configuration
+        """
+        return dict(
+            prunerr.runner.PrunerrRunner(self.CONFIG).example_confg["daemon"][
+                "metrics"
+            ],
+        )
@@ -6,6 +6,9 @@ Test Prunerr's configurable operations.
 """
 
 import os
+import time
+import unittest
+import json
 import logging
 
 from unittest import mock
@@ -16,6 +19,7 @@ import prunerr.runner
 import prunerr.downloadclient
 import prunerr.downloaditem
 import prunerr.operations
+import prunerr.columnar
 
 from . import test_downloaditem
 
@@ -273,3 +277,304 @@ class PrunerrDownloadItemTests(prunerrtests.PrunerrTestCase):
             logged_msgs.records[0].message,
             "Wrong logged record message",
         )
+
+    def test_operation_executor_files_patterns(self):
+        """
+        The files executor counts each item file matching any of the patterns once.
+        """
+        self.assertEqual(
+            self.operations.exec_operations(
+                [
+                    {
+                        "type": "files",
+                        "aggregation": "count",
+                        "patterns": [".+\\.mkv$", ".+\\.mkv$", ".+\\.nfo$"],
+                    },
+                ],
+                self.item,
+            )[1][0],
+            len(
+                [
+                    item_file
+                    for item_file in self.item.files
+                    if item_file.name.endswith((".mkv", ".nfo"))
+                ],
+            ),
+            "Wrong count of item files matching patterns",
+        )
+
+    def test_operation_executor_files_patterns_flags(self):
+        """
+        The files executor supports patterns with inline flags.
+        """
+        self.assertEqual(
+            self.operations.exec_operations(
+                [
+                    {
+                        "type": "files",
+                        "aggregation": "count",
+                        "patterns": [".+\\.nfo$", "(?i).+\\.MKV$"],
+                    },
+                ],
+                self.item,
+            )[1][0],
+            2,
+            "Wrong count of item files matching patterns with inline flags",
+        )
+
+    def test_operation_executor_files_patterns_backreferences(self):
+        """
+        The files executor supports patterns with numbered backreferences.
+        """
+        self.assertEqual(
+            self.operations.exec_operations(
+                [
+                    {
+                        "type": "files",
+                        "aggregation": "count",
+                        "patterns": [".+\\.(nfo)$", "(.+)/\\1\\.mkv$"],
+                    },
+                ],
+                self.item,
+            )[1][0],
+            2,
+            "Wrong count of item files matching patterns with backreferences",
+        )
+
+    def test_operations_indexer_tables(self):
+        """
+        Download items are matched to indexers and their positions by table lookups.
+        """
+        operations = prunerr.operations.PrunerrOperations(
+            self.download_client,
+            {
+                "hostnames": {
+                    "FirstTracker": ["first.example.com"],
+                    "SecondTracker": ["second.example.com", "other.example.com"],
+                },
+                "priorities": [
+                    {"name": "SecondTracker", "operations": []},
+                    {"name": None, "operations": []},
+                ],
+            },
+        )
+        trackers = [
+            {
+                "announce": "https://second.example.com/announce",
+                "scrape": "https://other.example.com/scrape",
+            },
+            {
+                "announce": "https://first.example.com/announce",
+                "scrape": "https://first.example.com/scrape",
+            },
+        ]
+        self.assertEqual(
+            operations.match_indexer(trackers),
+            "FirstTracker",
+            "Wrong indexer matched for trackers of more than one indexer",
+        )
+        self.assertEqual(
+            operations.get_indexer_config(trackers[:1]),
+            (0, operations.config["priorities"][0]),
+            "Wrong indexer position and config",
+        )
+        self.assertEqual(
+            operations.get_indexer_config(trackers[1:]),
+            (1, operations.config["priorities"][1]),
+            "Wrong fallback indexer position and config",
+        )
+
+    @unittest.skipIf(prunerr.columnar.numpy is None, "NumPy not installed")
+    def test_operations_columnar(self):
+        """
+        Operations evaluated for all items at once order the same as item by item.
+        """
+        operations = prunerr.operations.PrunerrOperations(
+            self.download_client,
+            {
+                "priorities": [
+                    {
+                        "name": None,
+                        "operations": [
+                            {
+                                "type": "or",
+                                "filter": True,
+                                "operations": [
+                                    {"type": "value", "name": "ratio", "minimum": 1},
+                                    {"type": "value", "name": "age", "maximum": 1},
+                                ],
+                            },
+                            {"type": "files", "reversed": True},
+                            {"type": "value", "name": "uploadedEver", "reversed": True},
+                            {
+                                "type": "value",
+                                "name": "size_when_done",
+                                "minimum": 10737418240,
+                                "reversed": True,
+                            },
+                            {"type": "value", "name": "size_when_done"},
+                        ],
+                    },
+                ],
+            },
+        )
+        items = self.download_client.items
+        columns = prunerr.columnar.exec_indexer_columns(operations, items)
+        self.assertIsNotNone(columns, "Operations not evaluated for all items at once")
+        includes, order = columns
+        self.assertEqual(
+            [items[item_idx] for item_idx in order],
+            sorted(
+                items,
+                key=lambda item: operations.exec_indexer_operations(item)[1],
+                reverse=True,
+            ),
+            "Wrong order from operations evaluated for all items at once",
+        )
+        self.assertEqual(
+            list(includes),
+            [operations.exec_indexer_operations(item)[0] for item in items],
+            "Wrong filtering from operations evaluated for all items at once",
+        )
+        with mock.patch("prunerr.columnar.numpy", None):
+            self.assertIsNone(
+                prunerr.columnar.exec_indexer_columns(operations, items),
+                "Operations evaluated for all items at once without NumPy",
+            )
+
+    def test_operations_memo(self):
+        """
+        Operation results are reused across daemon loops until the fields read change.
+        """
+        results = self.operations.exec_indexer_operations(self.item)
+        # As if the next daemon loop materialized the download item again
+        vars(self.item).pop("prunerr_operations_results")
+        with mock.patch.object(
+            self.operations,
+            "exec_operation_files",
+            wraps=self.operations.exec_operation_files,
+        ) as exec_operation_files:
+            self.assertEqual(
+                self.operations.exec_indexer_operations(self.item),
+                results,
+                "Wrong memoized operation results",
+            )
+            exec_operation_files.assert_not_called()
+
+            # Time dependent operations are re-evaluated after the configured period
+            vars(self.item).pop("prunerr_operations_results")
+            with mock.patch(
+                "time.time",
+                return_value=time.time()
+                + self.download_client.config["operations-memo-seconds"],
+            ):
+                self.operations.exec_indexer_operations(self.item)
+            exec_operation_files.assert_called_once()
+
+        # Changes to the fields read also re-evaluate the operations
+        vars(self.item).pop("prunerr_operations_results")
+        fields = vars(self.item)["_fields"]
+        fields["uploadRatio"] = fields["uploadRatio"]._replace(
+            value=fields["uploadRatio"].value + 1,
+        )
+        self.assertNotEqual(
+            self.operations.exec_indexer_operations(self.item),
+            results,
+            "Memoized operation results reused after the fields read changed",
+        )
+
+    def test_operations_profile(self):
+        """
+        Profiling records operation statistics and explains the inclusion and order.
+        """
+        self.download_client.operations_profile = (
+            prunerr.operations.PrunerrOperationsProfile()
+        )
+        operations = (
+            self.download_client.operations
+        ) = prunerr.operations.PrunerrOperations(
+            self.download_client,
+            {
+                "priorities": [
+                    {
+                        "name": None,
+                        "operations": [
+                            {
+                                "type": "or",
+                                "filter": True,
+                                "operations": [
+                                    {
+                                        "type": "value",
+                                        "name": "ratio",
+                                        "minimum": 1,
+                                    },
+                                    {"type": "value", "name": "age", "maximum": 1},
+                                ],
+                            },
+                            {"type": "files", "reversed": True},
+                            {"type": "value", "name": "size_when_done"},
+                        ],
+                    },
+                ],
+            },
+        )
+        items = self.download_client.items
+        sorted_items = self.download_client.sort_items_by_tracker(items)
+        profile = json.loads(json.dumps(operations.profile.as_json()))
+
+        self.assertEqual(
+            profile["operations"]["match-indexer"]["calls"],
+            len(items),
+            "Wrong number of indexer matches profiled",
+        )
+        self.assertEqual(
+            profile["operations"]["value"]["calls"],
+            len(items) * 3,
+            "Wrong number of nested and top-level operation calls profiled",
+        )
+        self.assertGreater(
+            profile["caches"]["item"]["hit-rate"],
+            0,
+            "Cached operation results not profiled",
+        )
+        for item in items:
+            explained = profile["items"][item.hashString]["priorities"]
+            include, _ = operations.exec_indexer_operations(item)
+            self.assertEqual(
+                explained["include"],
+                include,
+                "Wrong inclusion explained",
+            )
+            self.assertEqual(
+                [len(node["operations"]) for node in explained["operations"][:1]],
+                [2],
+                "Nested operations missing from the explanation",
+            )
+            decided = explained["operations"][0].get("decided", [])
+            if include:
+                self.assertNotIn(
+                    "include",
+                    decided,
+                    "Operation explained as deciding an included item's inclusion",
+                )
+            else:
+                self.assertIn(
+                    "include",
+                    decided,
+                    "Wrong operation explained as deciding the inclusion",
+                )
+        for item, next_item in zip(sorted_items, sorted_items[1:]):
+            explained = profile["items"][item.hashString]["priorities"]
+            sort_key = operations.exec_indexer_operations(item)[1]
+            if sort_key == operations.exec_indexer_operations(next_item)[1]:
+                self.assertEqual(
+                    explained["ordered-by"],
+                    "tie",
+                    "Equal sort keys not explained as a tie",
+                )
+                continue
+            self.assertIn(
+                "order",
+                explained["operations"][explained["ordered-by"]]["decided"],
+                "Operation that decided the order not explained",
+            )
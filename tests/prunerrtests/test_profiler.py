@@ -0,0 +1,76 @@
+# SPDX-FileCopyrightText: 2023 Ross Patterson <me@rpatterson.net>
+# SPDX-License-Identifier: MIT
+
+"""
+Prunerr profiles slow loops of the order of operations when enabled.
+"""
+
+import os
+import pstats
+
+from unittest import mock
+
+import prunerrtests
+
+import prunerr
+import prunerr.runner
+import prunerr.profiler
+
+
+@mock.patch.dict(os.environ, prunerrtests.PrunerrTestCase.ENV)
+class PrunerrProfilerTests(prunerrtests.PrunerrTestCase):
+    """
+    Prunerr profiles slow loops of the order of operations when enabled.
+    """
+
+    def test_profiler_exec(self):
+        """
+        The `exec` sub-command writes the statistics of the loop when profiling.
+        """
+        request_mocks = self.mock_responses()
+        profile_dir = self.tmp_path / "profiles"
+        prunerr.main(
+            args=[f"--config={self.CONFIG}", "exec", f"--profile={profile_dir}"],
+        )
+        self.assert_request_mocks(request_mocks)
+        stats_paths = list(profile_dir.glob("prunerr-*-loop-000001-*s.pstats"))
+        self.assertEqual(len(stats_paths), 1, "Wrong number of loop profiles written")
+        self.assertTrue(
+            pstats.Stats(str(stats_paths[0])).total_calls,
+            "Loop profile statistics empty",
+        )
+
+    def test_profiler_rotate(self):
+        """
+        Only the statistics of slow loops are written and old statistics are deleted.
+        """
+        profiler = prunerr.profiler.PrunerrProfiler(
+            prunerr.runner.PrunerrRunner(self.CONFIG),
+        )
+        self.assertEqual(
+            profiler.run(sum, [1, 2]),
+            3,
+            "Wrong loop results without profiling",
+        )
+        profiler.directory = str(self.tmp_path / "profiles")
+        profiler.update({"min-duration": 60, "keep": 2})
+        self.assertEqual(
+            profiler.run(sum, [1, 2]),
+            3,
+            "Wrong loop results when profiling",
+        )
+        self.assertFalse(
+            (self.tmp_path / "profiles").exists(),
+            "Profile written for a loop faster than the minimum duration",
+        )
+        profiler.update({"min-duration": 0, "keep": 2})
+        for _ in range(3):
+            profiler.run(sum, [1, 2])
+        self.assertEqual(
+            [
+                stats_path.name.split("-loop-")[1].split("-")[0]
+                for stats_path in sorted((self.tmp_path / "profiles").iterdir())
+            ],
+            ["000003", "000004"],
+            "Wrong loop profiles kept",
+        )
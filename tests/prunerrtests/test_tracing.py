@@ -0,0 +1,139 @@
+# SPDX-FileCopyrightText: 2023 Ross Patterson <me@rpatterson.net>
+# SPDX-License-Identifier: MIT
+
+"""
+Prunerr traces nested spans of time across each loop when enabled.
+"""
+
+import os
+import shutil
+import json
+
+from unittest import mock
+
+import prunerrtests
+
+import prunerr.runner
+import prunerr.tracing
+
+# The RPC span endpoint of the paged Servarr queue requests
+QUEUE_ENDPOINT = "GET queue"
+
+
+@mock.patch.dict(os.environ, prunerrtests.PrunerrTestCase.ENV)
+class PrunerrTracingTests(prunerrtests.PrunerrTestCase):
+    """
+    Prunerr traces nested spans of time across each loop when enabled.
+    """
+
+    def setUp(self):
+        """
+        Trace to a temporary file regardless of the example configuration.
+        """
+        super().setUp()
+        self.runner = prunerr.runner.PrunerrRunner(self.CONFIG)
+        self.trace_path = self.tmp_path / "trace.jsonl"
+        self.runner.tracer.update({"path": str(self.trace_path)})
+        self.addCleanup(self.runner.tracer.close)
+        update_patcher = mock.patch.object(self.runner.tracer, "update")
+        update_patcher.start()
+        self.addCleanup(update_patcher.stop)
+
+    def read_spans(self) -> dict:
+        """
+        Return the spans written to the trace file by name.
+
+        :return: The lists of spans read from the trace file keyed by span name
+        """
+        spans = {}
+        with self.trace_path.open(encoding="utf-8") as trace_opened:
+            for line in trace_opened:
+                span = json.loads(line)
+                spans.setdefault(span["name"], []).append(span)
+        return spans
+
+    def assert_parent(self, spans: dict, child_name: str, parent_name: str) -> None:
+        """
+        Assert that the first span with the child name is nested in the parent.
+
+        :param spans: The lists of spans keyed by span name
+        :param child_name: The name of the span that should be nested
+        :param parent_name: The name of the span that should contain the child
+        """
+        self.assertIn(
+            spans[child_name][0]["parent"],
+            [span["span"] for span in spans[parent_name]],
+            f"Span {child_name!r} not nested in {parent_name!r}",
+        )
+
+    def test_tracing_loop(self):
+        """
+        Each loop is a trace with spans nested from phases down to API calls.
+        """
+        request_mocks = self.mock_responses()
+        with self.runner.tracer.trace("loop"):
+            with self.runner.phase("update"):
+                self.runner.update()
+            self.runner.exec_()
+        self.runner.wait_moves()
+        self.runner.resume_verified_items(wait=True)
+        self.assert_request_mocks(request_mocks)
+
+        spans = self.read_spans()
+        (loop_span,) = spans["loop"]
+        self.assertIsNone(loop_span["parent"], "Loop span nested in another span")
+        self.assertEqual(
+            {span["trace"] for name_spans in spans.values() for span in name_spans},
+            {loop_span["trace"]},
+            "Spans from more than one trace for one loop",
+        )
+        self.assert_parent(spans, "update", "loop")
+        self.assert_parent(spans, "PrunerrServarrInstance.update", "update")
+        self.assert_parent(spans, "page", "PrunerrServarrInstance.update")
+        self.assertEqual(
+            spans["page"][0]["attributes"],
+            {"endpoint": "queue", "page": 1},
+            "Wrong paged request span attributes",
+        )
+        queue_spans = [
+            span
+            for span in spans["rpc"]
+            if span["attributes"]["endpoint"] == QUEUE_ENDPOINT
+        ]
+        self.assertIn(
+            queue_spans[0]["parent"],
+            [span["span"] for span in spans["page"]],
+            "API call span not nested in the paged request span",
+        )
+        for phase in ("verify", "move", "free-space"):
+            self.assert_parent(spans, phase, "loop")
+
+    def test_tracing_background_deletion(self):
+        """
+        Deletions in background threads are nested in the span that submitted them.
+        """
+        deleted_item = self.storage_dir / "deleted" / self.EXAMPLE_VIDEO.stem
+        deleted_item.mkdir(parents=True)
+        shutil.copy2(self.EXAMPLE_VIDEO, deleted_item / self.EXAMPLE_VIDEO.name)
+        self.runner.deleter.update(
+            dict(
+                self.runner.example_confg["deletion"],
+                workers=1,
+                journal=str(self.tmp_path / "deletions.json"),
+            ),
+        )
+        self.addCleanup(self.runner.deleter.executor.shutdown)
+        with self.runner.tracer.trace("loop"):
+            self.runner.deleter.submit(deleted_item, 1)
+        self.runner.deleter.wait()
+
+        spans = self.read_spans()
+        self.assert_parent(spans, "delete", "loop")
+        self.assertTrue(
+            spans["delete"][0]["thread"].startswith("prunerr-deleter"),
+            "Deletion span not from the background thread",
+        )
+        self.assertFalse(
+            prunerr.tracing.CURRENT_SPAN.get(),
+            "Span still current after the trace",
+        )
@@ -9,6 +9,8 @@ import os
 
 from unittest import mock
 
+import transmission_rpc
+
 import prunerrtests
 
 import prunerr
@@ -39,3 +41,87 @@ class PrunerrVerifyTests(prunerrtests.PrunerrTestCase):
         verify_request_mocks = self.mock_responses()
         prunerr.main(args=[f"--config={self.CONFIG}", "exec"])
         self.assert_request_mocks(verify_request_mocks)
+
+    def test_verify_wait(self):
+        """
+        Prunerr polls verifying items less often the longer they're estimated to take.
+        """
+        self.mock_responses()
+        runner = prunerr.runner.PrunerrRunner(self.CONFIG)
+        runner.update()
+        download_client = runner.download_clients[
+            prunerr.utils.normalize_url(self.download_client_urls[0])
+        ]
+        self.assertEqual(
+            download_client.verifier.verify_wait(),
+            download_client.verifier.VERIFY_WAIT_MIN,
+            "Wrong poll wait without any verification progress",
+        )
+        download_client.verifier.verifying_progress.update(
+            foo=(0, 0.1, 30),
+            bar=(0, 0.5, 10),
+            qux=(0, 0, None),
+        )
+        self.assertEqual(
+            download_client.verifier.verify_wait(),
+            5,
+            "Wrong poll wait for verification progress",
+        )
+        download_client.verifier.verifying_progress.update(bar=(0, 0.1, 3600))
+        self.assertEqual(
+            download_client.verifier.verify_wait(),
+            15,
+            "Wrong poll wait after verification progress slows",
+        )
+        download_client.verifier.verifying_progress.update(foo=(0, 0.1, 3600))
+        self.assertEqual(
+            download_client.verifier.verify_wait(),
+            download_client.verifier.VERIFY_WAIT_MAX,
+            "Wrong poll wait for very slow verification progress",
+        )
+
+    def test_verify_queue(self):
+        """
+        Prunerr verifies the smallest corrupt items first, one at a time per disk.
+        """
+        self.mock_responses()
+        runner = prunerr.runner.PrunerrRunner(self.CONFIG)
+        runner.update()
+        download_client = runner.download_clients[
+            prunerr.utils.normalize_url(self.download_client_urls[0])
+        ]
+        (small_record,) = download_client.records
+        small_fields = small_record.torrent._fields  # pylint: disable=protected-access
+        large_record = prunerr.downloaditem.PrunerrDownloadItemRecord(
+            download_client,
+            transmission_rpc.Torrent(
+                download_client.client,
+                dict(
+                    {
+                        field_name: field.value
+                        for field_name, field in small_fields.items()
+                    },
+                    id=2,
+                    hashString="LARGE",
+                    totalSize=small_record.totalSize * 2,
+                ),
+            ),
+        )
+        download_client.records = [large_record, small_record]
+        with mock.patch.object(download_client.client, "verify_torrent") as verify:
+            self.assertEqual(
+                download_client.verifier.verify_corrupt_items(),
+                [small_record.hashString],
+                "Wrong corrupt items verified first",
+            )
+            self.assertIsNone(
+                download_client.verifier.verify_corrupt_items(),
+                "Corrupt item verified beyond the limit",
+            )
+            download_client.verifier.verifying_items.clear()
+            self.assertEqual(
+                download_client.verifier.verify_corrupt_items(),
+                [large_record.hashString],
+                "Queued corrupt item not verified after earlier items finish",
+            )
+        self.assertEqual(verify.call_count, 2, "Wrong number of verify requests")